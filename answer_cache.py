@@ -0,0 +1,153 @@
+# Two-level cache in front of the FAQ answer lookup.
+#   Level 1: normalized query text -> query embedding, so repeated questions skip the encoder
+#   Level 2: (normalized query text, lang) -> final answer (already translated into lang)
+# Optionally, a query whose embedding is within near_duplicate_threshold (cosine similarity)
+# of an already answered query in the same language reuses that answer.
+# Both levels are bounded LRUs and are cleared when the FAQ index version changes.
+import re
+import string
+import threading
+
+import numpy as np
+
+from lru_cache import LRUCache
+
+_PUNCTUATION = re.compile(f"[{re.escape(string.punctuation)}¿¡।]+")
+_WHITESPACE = re.compile(r"\s+")
+
+
+def normalize_query(text):
+    # "How do I reset my PIN?" and "how do i  reset my pin" share a cache entry
+    text = _PUNCTUATION.sub(' ', text.lower())
+    return _WHITESPACE.sub(' ', text).strip()
+
+
+class EmbeddingMatrix:
+    # Embeddings of the cached queries of one language, one row per key, updated in place:
+    # new keys are appended (capacity doubles when full), removed keys swap in the last row
+    def __init__(self):
+        self.keys = []
+        self.rows = {} # Key: cache key, Value: row in matrix
+        self.matrix = None
+
+    def __len__(self):
+        return len(self.keys)
+
+    def put(self, key, embedding):
+        embedding = np.asarray(embedding, dtype=np.float32)
+        row = self.rows.get(key)
+        if row is None:
+            row = len(self.keys)
+            if self.matrix is None:
+                self.matrix = np.empty((64, len(embedding)), dtype=np.float32)
+            elif row == len(self.matrix):
+                self.matrix = np.concatenate([self.matrix, np.empty_like(self.matrix)])
+            self.keys.append(key)
+            self.rows[key] = row
+        self.matrix[row] = embedding
+
+    def remove(self, key):
+        row = self.rows.pop(key, None)
+        if row is None:
+            return
+        last_key = self.keys.pop()
+        if last_key != key:
+            last = len(self.keys)
+            self.matrix[row] = self.matrix[last]
+            self.keys[row] = last_key
+            self.rows[last_key] = row
+
+    def best(self, query_embedding):
+        # (key, score) of the most similar row
+        scores = self.matrix[:len(self.keys)] @ np.asarray(query_embedding, dtype=np.float32)
+        best = int(np.argmax(scores))
+        return self.keys[best], float(scores[best])
+
+
+class AnswerCache:
+    def __init__(self, max_answers=5000, max_embeddings=20000, near_duplicate_threshold=None, version=None):
+        self.embeddings = LRUCache(max_embeddings)
+        self.answers = LRUCache(max_answers) # Value: (result, query embedding or None)
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.near_duplicate_hits = 0
+        self.version = version
+        self._matrices = {} # Key: lang, Value: EmbeddingMatrix of the cached answers with an embedding
+        self._lock = threading.Lock()
+
+    def set_version(self, version):
+        # Drop everything cached for an older FAQ index
+        with self._lock:
+            if version == self.version:
+                return
+            self.version = version
+            self._clear()
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self.embeddings.clear()
+        self.answers.clear()
+        self._matrices.clear()
+
+    def embed(self, text, encode):
+        # Query embedding from level 1, computed with encode(text) on a miss
+        key = normalize_query(text)
+        embedding = self.embeddings.get(key)
+        if embedding is None:
+            version = self.version
+            embedding = encode(text)
+            with self._lock:
+                # Not cached if the index (and maybe its encoder) changed while encoding
+                if self.version == version:
+                    self.embeddings.put(key, embedding)
+        return embedding
+
+    def get_answer(self, query, lang):
+        entry = self.answers.get((normalize_query(query), lang))
+        return entry[0] if entry is not None else None
+
+    def get_similar_answer(self, query_embedding, lang):
+        # Answer of the most similar cached query in this language, if above the threshold
+        if self.near_duplicate_threshold is None or query_embedding is None:
+            return None
+        with self._lock:
+            matrix = self._matrices.get(lang)
+            if not matrix:
+                return None
+            key, score = matrix.best(query_embedding)
+        if score < self.near_duplicate_threshold:
+            return None
+        entry = self.answers.get(key)
+        if entry is None:
+            return None # Evicted in the meantime
+        self.near_duplicate_hits += 1
+        return entry[0]
+
+    def put_answer(self, query, lang, result, query_embedding=None):
+        key = (normalize_query(query), lang)
+        if self.near_duplicate_threshold is None:
+            self.answers.put(key, (result, query_embedding))
+            return
+        with self._lock: # Keeps the matrices in step with the answers
+            evicted = self.answers.put(key, (result, query_embedding))
+            if query_embedding is not None:
+                self._matrices.setdefault(lang, EmbeddingMatrix()).put(key, query_embedding)
+            elif lang in self._matrices:
+                self._matrices[lang].remove(key)
+            for evicted_key in evicted:
+                if evicted_key[1] in self._matrices:
+                    self._matrices[evicted_key[1]].remove(evicted_key)
+
+    def stats(self):
+        return {
+            'version': self.version,
+            'embeddings': len(self.embeddings),
+            'embedding_hits': self.embeddings.hits,
+            'embedding_misses': self.embeddings.misses,
+            'answers': len(self.answers),
+            'answer_hits': self.answers.hits,
+            'answer_misses': self.answers.misses,
+            'near_duplicate_hits': self.near_duplicate_hits
+        }
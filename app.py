@@ -1,392 +1,839 @@
-from flask import Flask, request, jsonify, session
-from flask_cors import CORS
-from backend.language import detect_language, translate_text
-from backend.semantic_search import get_best_answer
-from backend.orchestrator import orchestrator_agent
-import uuid
-import time # For timestamps
-
-app = Flask(__name__)
-CORS(app)
-app.secret_key = 'super_secret_key' # Replace with a strong, random key in production
-
-# Simple in-memory storage for session context (for demonstration only)
-# In a real application, use a proper session management system (e.g., Flask-Session, Redis, database)
-session_contexts = {}
-
-# Centralized storage for agent-customer chat messages
-# Key: customer_id, Value: list of message dictionaries
-# Each message dict: { 'sender': 'user'/'agent'/'bot', 'original_text': '', 'translated_text': '', 'lang': '', 'timestamp': '', 'read_by_agent': bool }
-agent_customer_chats = {}
-
-@app.route('/chat', methods=['POST'])
-def chat():
-    user_message = request.json.get('message')
-    session_id = request.json.get('session_id')
-    is_agent_chat = request.json.get('is_agent_chat', False)
-    sender_type = request.json.get('sender_type') # 'customer' or 'agent'
-    customer_id_for_agent = request.json.get('customer_id') # Only sent by agent
-
-    if not session_id:
-        session_id = str(uuid.uuid4())
-    
-    # Initialize context for this session if it doesn't exist
-    if session_id not in session_contexts:
-        session_contexts[session_id] = {
-            'awaiting_customer_id': False,
-            'awaiting_transaction_month': False,
-            'user_query_for_orchestration': None,
-            'customer_id': None, # This will store the actual customer_id once known
-            'transaction_month': None,
-            'is_connected_to_agent': False, # New flag to indicate agent connection
-            'customer_original_lang': 'en', # Default, will be detected and updated
-            'customer_name': 'Customer' # Default name
-        }
-    
-    current_context = session_contexts[session_id]
-
-    if not user_message:
-        return jsonify({"error": "No message provided", "session_id": session_id}), 400
-
-    current_time = time.strftime('%H:%M')
-
-    if is_agent_chat:
-        # This is a message exchanged between a customer and an agent
-        # Determine the target customer ID for this chat
-        target_customer_id = customer_id_for_agent if sender_type == 'agent' else current_context.get('customer_id')
-        
-        if not target_customer_id:
-            return jsonify({"error": "Customer ID missing for agent chat", "session_id": session_id}), 400
-
-        # Ensure a chat entry exists for this customer ID
-        if target_customer_id not in agent_customer_chats:
-            agent_customer_chats[target_customer_id] = []
-
-        if sender_type == 'customer':
-            # Customer sending message to agent
-            detected_lang = detect_language(user_message)
-            
-            # Update the customer's original language in their session context
-            # Find the session context associated with this customer_id
-            found_session_id = None
-            for sess_id, context in session_contexts.items():
-                if context.get('customer_id') == target_customer_id:
-                    found_session_id = sess_id
-                    session_contexts[found_session_id]['customer_original_lang'] = detected_lang
-                    break
-            if not found_session_id:
-                # Fallback: if session_id for this customer_id isn't found,
-                # create a temporary context or use the current session_id
-                # This handles cases where customer might refresh or session is lost
-                session_contexts[session_id]['customer_id'] = target_customer_id
-                session_contexts[session_id]['is_connected_to_agent'] = True
-                session_contexts[session_id]['customer_original_lang'] = detected_lang
-
-
-            translated_to_english = translate_text(user_message, source=detected_lang, target='en')
-            
-            message_obj = {
-                'sender': 'user', # In the agent's view, this is 'user' (customer)
-                'original_text': user_message,
-                'translated_text': translated_to_english, # English for agent
-                'lang': detected_lang,
-                'timestamp': current_time,
-                'read_by_agent': False # New message, not yet read by agent
-            }
-            agent_customer_chats[target_customer_id].append(message_obj)
-            print(f"Customer message received for agent ({target_customer_id}): {user_message} (Original Lang: {detected_lang}) -> {translated_to_english} (English)")
-            return jsonify({"status": "Message sent to agent", "session_id": session_id})
-
-        elif sender_type == 'agent':
-            # Agent sending message to customer
-            customer_lang = 'en' # Default, assume agent types in English.
-            # Find the customer's original language from session_contexts using target_customer_id
-            for sess_id, context in session_contexts.items():
-                if context.get('customer_id') == target_customer_id:
-                    customer_lang = context.get('customer_original_lang', 'en')
-                    break
-            
-            translated_to_customer_lang = translate_text(user_message, source='en', target=customer_lang)
-            
-            message_obj = {
-                'sender': 'agent',
-                'original_text': user_message,
-                'translated_text': translated_to_customer_lang, # In customer's language
-                'lang': 'en', # Agent's input language
-                'timestamp': current_time
-            }
-            agent_customer_chats[target_customer_id].append(message_obj)
-            print(f"Agent message received for customer ({target_customer_id}): {user_message} (Agent Input) -> {translated_to_customer_lang} (Customer Lang: {customer_lang})")
-            return jsonify({"status": "Message sent to customer", "session_id": session_id})
-        else:
-            return jsonify({"error": "Invalid sender type for agent chat", "session_id": session_id}), 400
-
-    else:
-        # This is a customer-bot interaction
-        lang = detect_language(user_message)
-        current_context['customer_original_lang'] = lang # Store initial customer language
-        
-        # Existing bot logic
-        try:
-            if current_context['awaiting_customer_id']:
-                current_context['customer_id'] = user_message.strip()
-                current_context['awaiting_customer_id'] = False
-                current_context['awaiting_transaction_month'] = True
-                bot_response = "Thank you. Please enter the transaction month (e.g., 2024-05):"
-            
-            elif current_context['awaiting_transaction_month']:
-                current_context['transaction_month'] = user_message.strip()
-                current_context['awaiting_transaction_month'] = False
-                
-                original_query = current_context['user_query_for_orchestration']
-                customer_id = current_context['customer_id']
-                transaction_month = current_context['transaction_month']
-
-                if original_query and customer_id and transaction_month:
-                    print(f"[Orchestrator AI Agent Activated for session {session_id}]")
-                    print(f"User Query: {original_query}, Customer ID: {customer_id}, Month: {transaction_month}")
-                    orchestration_result = orchestrator_agent.orchestrate_transaction(
-                        original_query, lang, customer_id, transaction_month
-                    )
-                    bot_response = orchestration_result
-                    # Clear context after successful orchestration
-                    session_contexts[session_id] = {
-                        'awaiting_customer_id': False,
-                        'awaiting_transaction_month': False,
-                        'user_query_for_orchestration': None,
-                        'customer_id': customer_id,
-                        'transaction_month': None,
-                        'is_connected_to_agent': False,
-                        'customer_original_lang': lang,
-                        'customer_name': current_context.get('customer_name', 'Customer')
-                    }
-                else:
-                    bot_response = "I seem to have lost track of our conversation. Please start your query again."
-                    # Clear context due to inconsistency
-                    session_contexts[session_id] = {
-                        'awaiting_customer_id': False,
-                        'awaiting_transaction_month': False,
-                        'user_query_for_orchestration': None,
-                        'customer_id': None,
-                        'transaction_month': None,
-                        'is_connected_to_agent': False,
-                        'customer_original_lang': lang,
-                        'customer_name': current_context.get('customer_name', 'Customer')
-                    }
-            
-            else: # Initial query or non-transactional query
-                if orchestrator_agent.is_transactional(user_message, lang):
-                    print(f"[Orchestrator AI Agent Detected Transactional Intent for session {session_id}]")
-                    current_context['awaiting_customer_id'] = True
-                    current_context['user_query_for_orchestration'] = user_message # Store original query
-                    bot_response = "I can help with that! Please provide your Customer ID:"
-                else:
-                    # Fallback to semantic search for non-transactional queries
-                    result = get_best_answer(user_message, source_lang=lang)
-                    bot_response = result.get('translated_answer', "I'm sorry, I couldn't find an answer to that.")
-                    # Ensure context is clean for non-transactional queries
-                    session_contexts[session_id] = {
-                        'awaiting_customer_id': False,
-                        'awaiting_transaction_month': False,
-                        'user_query_for_orchestration': None,
-                        'customer_id': None,
-                        'transaction_month': None,
-                        'is_connected_to_agent': False,
-                        'customer_original_lang': lang,
-                        'customer_name': current_context.get('customer_name', 'Customer')
-                    }
-
-        except Exception as e:
-            print(f"Error processing message with backend: {e}")
-            bot_response = "I apologize, but I encountered an error. Please try again later."
-            # Clear context on error to prevent being stuck
-            session_contexts[session_id] = {
-                'awaiting_customer_id': False,
-                'awaiting_transaction_month': False,
-                'user_query_for_orchestration': None,
-                'customer_id': None,
-                'transaction_month': None,
-                'is_connected_to_agent': False,
-                'customer_original_lang': lang,
-                'customer_name': current_context.get('customer_name', 'Customer')
-            }
-
-        return jsonify({"response": bot_response, "session_id": session_id})
-
-# New endpoint for agent to fetch messages for a specific customer
-@app.route('/get_agent_messages', methods=['POST'])
-def get_agent_messages():
-    customer_id = request.json.get('customer_id')
-    if not customer_id:
-        return jsonify({"error": "Customer ID required"}), 400
-
-    messages_for_agent = []
-    if customer_id in agent_customer_chats:
-        for msg in agent_customer_chats[customer_id]:
-            if msg['sender'] == 'user': # These are customer messages
-                messages_for_agent.append({
-                    'sender': 'user',
-                    'text': msg['translated_text'], # Agent gets English
-                    'time': msg['timestamp']
-                })
-                msg['read_by_agent'] = True # Mark as read when agent fetches
-            elif msg['sender'] == 'agent': # These are agent's own messages
-                 messages_for_agent.append({
-                    'sender': 'agent',
-                    'text': msg['original_text'], # Agent sees their original English message
-                    'time': msg['timestamp']
-                })
-            elif msg['sender'] == 'bot': # Include bot messages for agent's context
-                messages_for_agent.append({
-                    'sender': 'bot',
-                    'text': msg['translated_text'], # Bot messages are already English
-                    'time': msg['timestamp']
-                })
-    return jsonify({"messages": messages_for_agent})
-
-# New endpoint for customer to fetch messages
-@app.route('/get_customer_messages', methods=['POST'])
-def get_customer_messages():
-    session_id = request.json.get('session_id')
-    if not session_id:
-        return jsonify({"error": "Session ID required"}), 400
-
-    customer_id = session_contexts[session_id].get('customer_id')
-    if not customer_id:
-        return jsonify({"error": "Customer ID not found for session"}), 400
-
-    messages_for_customer = []
-    if customer_id in agent_customer_chats:
-        for msg in agent_customer_chats[customer_id]:
-            if msg['sender'] == 'agent': # These are agent messages
-                messages_for_customer.append({
-                    'sender': 'bot', # Customer sees agent as 'bot' in their chat
-                    'text': msg['translated_text'], # Customer gets their original language
-                    'time': msg['timestamp']
-                })
-            elif msg['sender'] == 'user': # These are customer's own messages
-                messages_for_customer.append({
-                    'sender': 'user',
-                    'text': msg['original_text'], # Customer sees their original message
-                    'time': msg['timestamp']
-                })
-            elif msg['sender'] == 'bot': # Include bot messages for customer's context
-                messages_for_customer.append({
-                    'sender': 'bot',
-                    'text': msg['original_text'], # Bot messages are already in customer's original language
-                    'time': msg['timestamp']
-                })
-    return jsonify({"messages": messages_for_customer})
-
-# New endpoint to initiate agent chat from customer side (sends initial history)
-@app.route('/initiate_agent_chat', methods=['POST'])
-def initiate_agent_chat():
-    session_id = request.json.get('session_id')
-    customer_name = request.json.get('customer_name')
-    customer_id = request.json.get('customer_id')
-    chat_history = request.json.get('chat_history') # List of {sender, text, time}
-
-    if not session_id or not customer_name or not customer_id or not chat_history:
-        return jsonify({"error": "Missing data for agent chat initiation"}), 400
-
-    # Ensure session context exists and set connected to agent
-    if session_id not in session_contexts:
-        session_contexts[session_id] = {
-            'awaiting_customer_id': False,
-            'awaiting_transaction_month': False,
-            'user_query_for_orchestration': None,
-            'customer_id': customer_id, # Set customer_id here
-            'transaction_month': None,
-            'is_connected_to_agent': True,
-            'customer_original_lang': 'en', # Will be updated by first customer message in history
-            'customer_name': customer_name # Store customer name in session context
-        }
-    else:
-        session_contexts[session_id]['is_connected_to_agent'] = True
-        session_contexts[session_id]['customer_id'] = customer_id
-        session_contexts[session_id]['customer_name'] = customer_name
-
-    # Initialize chat history for this customer in agent_customer_chats
-    if customer_id not in agent_customer_chats:
-        agent_customer_chats[customer_id] = []
-
-    # Process and add existing chat history to agent_customer_chats
-    for msg in chat_history:
-        if msg['sender'] == 'user':
-            detected_lang = detect_language(msg['text'])
-            session_contexts[session_id]['customer_original_lang'] = detected_lang # Update customer's language
-            translated_to_english = translate_text(msg['text'], source=detected_lang, target='en')
-            agent_customer_chats[customer_id].append({
-                'sender': 'user',
-                'original_text': msg['text'],
-                'translated_text': translated_to_english,
-                'lang': detected_lang,
-                'timestamp': msg['time'],
-                'read_by_agent': False # New message, not yet read by agent
-            })
-        elif msg['sender'] == 'bot':
-            # For bot messages in history, we store them as is for agent's reference
-            # No translation needed as they are already in English (from bot)
-            agent_customer_chats[customer_id].append({
-                'sender': 'bot', # Mark as bot message
-                'original_text': msg['text'],
-                'translated_text': msg['text'], # Bot messages are already English
-                'lang': 'en',
-                'timestamp': msg['time']
-            })
-        elif msg['sender'] == 'agent':
-            # If agent messages are in the customer's history (e.g., from a previous agent chat)
-            # We assume they were originally English when sent by agent
-            agent_customer_chats[customer_id].append({
-                'sender': 'agent',
-                'original_text': msg['text'], # Agent's original message
-                'translated_text': msg['text'], # Assume agent's message was in English
-                'lang': 'en',
-                'timestamp': msg['time']
-            })
-
-
-    print(f"Agent chat initiated for customer {customer_id}. History transferred.")
-    return jsonify({"status": "Agent chat initiated", "session_id": session_id})
-
-# New endpoint to get a summary of active customer chats for the agent dashboard sidebar
-@app.route('/get_active_customer_chats', methods=['GET'])
-def get_active_customer_chats():
-    active_chats_summary = []
-    for customer_id, messages in agent_customer_chats.items():
-        customer_name = customer_id # Default to ID
-        # Try to find the customer's name from session_contexts
-        for sess_id, context in session_contexts.items():
-            if context.get('customer_id') == customer_id:
-                customer_name = context.get('customer_name', customer_id)
-                break
-
-        last_message = messages[-1] if messages else None
-        last_message_text = "No messages"
-        last_message_time = ""
-
-        if last_message:
-            if last_message['sender'] == 'user':
-                last_message_text = last_message['translated_text'] # Agent sees customer's message in English
-            elif last_message['sender'] == 'agent':
-                last_message_text = last_message['original_text'] # Agent sees their own message in English
-            elif last_message['sender'] == 'bot':
-                last_message_text = last_message['translated_text'] # Agent sees bot's message in English
-            last_message_time = last_message['timestamp']
-
-        # Calculate unread count for agent (only user messages not yet read by agent)
-        unread_count = sum(1 for msg in messages if msg['sender'] == 'user' and not msg.get('read_by_agent', False))
-
-        active_chats_summary.append({
-            'id': customer_id,
-            'name': customer_name,
-            'avatar': '👤', # Default avatar
-            'lastMessage': last_message_text,
-            'lastTime': last_message_time,
-            'unread': unread_count
-        })
-    return jsonify({"chats": active_chats_summary})
-
-
-if __name__ == '__main__':
-    app.run(debug=True, port=5000)
+from flask import Flask, request, jsonify, session, Response
+from flask_cors import CORS
+from model_registry import models
+from session_store import new_context
+from state_backend import create_backend
+from message_broker import MessageBroker
+from translation_cache import TranslationCache
+from language_batch import detect_language_batch, translate_batch
+from faq_index import FaqIndex, encode_texts, get_encoder
+from answer_cache import AnswerCache
+from inference_scheduler import BatchScheduler
+from intent_fast_path import TieredClassifier
+from transaction_store import get_transaction_store
+from request_tracing import Tracer
+import json
+import os
+import threading
+import uuid
+import time # For timestamps
+
+app = Flask(__name__)
+CORS(app)
+app.secret_key = 'super_secret_key' # Replace with a strong, random key in production
+
+# Backend models are loaded on first use (see model_registry.py) instead of at import time
+detect_language = models.lazy('language', 'detect_language')
+translate_text = models.lazy('language', 'translate_text')
+get_best_answer = models.lazy('semantic_search', 'get_best_answer')
+orchestrator_agent = models.lazy('orchestrator', 'orchestrator_agent')
+
+# Per-request stage timings, exported on /metrics (see request_tracing.py). Requests slower than
+# VISTA_SLOW_REQUEST_MS are logged with their stage breakdown. VISTA_PROFILE_SAMPLE_RATE (e.g. 0.01)
+# runs that share of requests under cProfile and keeps the profiles of the slow ones, also
+# written to VISTA_PROFILE_DIR when set
+tracer = Tracer(
+    slow_request_seconds=float(os.environ.get('VISTA_SLOW_REQUEST_MS', 1000)) / 1000,
+    profile_sample_rate=float(os.environ.get('VISTA_PROFILE_SAMPLE_RATE', 0)),
+    profile_dir=os.environ.get('VISTA_PROFILE_DIR')
+)
+
+# State shared between requests (see state_backend.py), selected with VISTA_STATE_BACKEND:
+#   'memory' (default): in this process only, so run a single worker
+#   'sqlite': in the SQLite file VISTA_STATE_DB (WAL mode), shared by all worker processes
+#
+# session_contexts: session_id -> context dict, plus a customer_id -> session_id index.
+# Always change a context through session_contexts.update() (or replace it with
+# session_contexts[session_id] = ...): it keeps the index consistent and is what saves the
+# change with the sqlite backend.
+# Sessions unused for VISTA_SESSION_IDLE_TTL seconds (default 1 hour, 0 disables) are evicted
+#
+# agent_customer_chats: customer_id -> chat log (messages plus sequence / unread counters)
+# Each message (a ChatMessage record, read like a dict): { 'sender': 'user'/'agent'/'bot', 'original_text': '', 'translated_text': '', 'lang': '', 'timestamp': '', 'read_by_agent': bool, 'seq': int }
+# With the memory backend, only the newest VISTA_CHAT_MEMORY_MESSAGES messages per chat stay in
+# memory, older ones go to an append-only SQLite archive (VISTA_CHAT_ARCHIVE_DB, or a temporary
+# file) and are loaded on scroll-back. Chats idle for VISTA_SESSION_IDLE_TTL are archived and
+# dropped from memory.
+STATE_BACKEND = os.environ.get('VISTA_STATE_BACKEND', 'memory')
+SESSION_IDLE_TTL = float(os.environ.get('VISTA_SESSION_IDLE_TTL', 3600)) or None
+session_contexts, agent_customer_chats = create_backend(
+    STATE_BACKEND,
+    idle_ttl_seconds=SESSION_IDLE_TTL,
+    db_path=os.environ.get('VISTA_STATE_DB'),
+    archive_path=os.environ.get('VISTA_CHAT_ARCHIVE_DB'),
+    max_in_memory=int(os.environ.get('VISTA_CHAT_MEMORY_MESSAGES', 200))
+)
+
+# Pushes new chat messages to agents and customers connected to the /stream endpoints
+# Topics: 'agents' (every agent dashboard), 'agent:<customer_id>' (agent with that chat open),
+# 'customer:<customer_id>' (the customer's own chat window)
+message_broker = MessageBroker()
+STREAM_KEEPALIVE_SECONDS = 15
+STREAM_POLL_SECONDS = STREAM_KEEPALIVE_SECONDS if STATE_BACKEND == 'memory' else 1
+MAX_HISTORY_PAGE = 200 # Most messages returned by one scroll-back request
+
+# Cache for translate_text results, keyed by (text, source, target)
+# Set VISTA_TRANSLATION_CACHE_DB to a file path to keep the cache warm across restarts
+translation_cache = TranslationCache(
+    translate_text,
+    max_entries=int(os.environ.get('VISTA_TRANSLATION_CACHE_SIZE', 10000)),
+    ttl_seconds=float(os.environ['VISTA_TRANSLATION_CACHE_TTL']) if os.environ.get('VISTA_TRANSLATION_CACHE_TTL') else None,
+    db_path=os.environ.get('VISTA_TRANSLATION_CACHE_DB')
+)
+translate_traced = tracer.traced('translate_text')(translation_cache.translate)
+
+# Optional precomputed FAQ embedding index (built with `python faq_index.py build ...`)
+# When VISTA_FAQ_INDEX is set, non-transactional queries are answered from the memory-mapped
+# index instead of backend.semantic_search.get_best_answer
+FAQ_INDEX_DIR = os.environ.get('VISTA_FAQ_INDEX')
+FAQ_MIN_SCORE = float(os.environ.get('VISTA_FAQ_MIN_SCORE', 0.5)) # Below this similarity there is no answer
+# Search engine for the index: 'exact' (default), 'ivf' or 'hnsw' for large knowledge bases,
+# tuned with JSON parameters, e.g. VISTA_FAQ_SEARCH_PARAMS='{"n_probe": 16}' (see search_engines.py)
+FAQ_SEARCH_ENGINE = os.environ.get('VISTA_FAQ_SEARCH_ENGINE', 'exact')
+FAQ_SEARCH_PARAMS = json.loads(os.environ.get('VISTA_FAQ_SEARCH_PARAMS', '{}'))
+faq_index = FaqIndex.load(FAQ_INDEX_DIR, FAQ_SEARCH_ENGINE, **FAQ_SEARCH_PARAMS) if FAQ_INDEX_DIR else None
+FAQ_VERSION_CHECK_SECONDS = 30 # How often to look for a rebuilt index on disk
+faq_version_checked_at = time.time()
+faq_reload_lock = threading.Lock() # Held while a background thread loads a rebuilt index
+
+# Cache of query embeddings and final answers in front of the FAQ lookup, cleared when the
+# FAQ index version changes. VISTA_ANSWER_CACHE_NEAR_DUPLICATE (e.g. 0.95) also reuses the
+# answer of a very similar earlier query; that needs the FAQ index to embed queries.
+answer_cache = AnswerCache(
+    max_answers=int(os.environ.get('VISTA_ANSWER_CACHE_SIZE', 5000)),
+    max_embeddings=int(os.environ.get('VISTA_EMBEDDING_CACHE_SIZE', 20000)),
+    near_duplicate_threshold=float(os.environ['VISTA_ANSWER_CACHE_NEAR_DUPLICATE']) if os.environ.get('VISTA_ANSWER_CACHE_NEAR_DUPLICATE') else None,
+    version=faq_index.version if faq_index is not None else None
+)
+if faq_index is not None:
+    models.register('faq_encoder', lambda: get_encoder(faq_index.model_name))
+
+# Transaction data for the orchestrator (see transaction_store.py), configured with
+# VISTA_TRANSACTION_DB; opened at startup so a bad path fails here rather than mid-request.
+# The orchestrator gets the same instance from get_transaction_store().
+transaction_store = get_transaction_store()
+
+# VISTA_MODEL_WARMUP: 'background' (default) loads all models in a background thread right
+# after startup, 'eager' loads them before the app starts serving, 'lazy' on first use only
+MODEL_WARMUP = os.environ.get('VISTA_MODEL_WARMUP', 'background')
+if MODEL_WARMUP in ('background', 'eager'):
+    models.warm_up(background=MODEL_WARMUP == 'background')
+
+
+def classify_transactional_batch(items):
+    # items: [(query, lang)]. Uses orchestrator_agent.is_transactional_batch(queries, langs)
+    # when the backend provides it, otherwise classifies one by one on the scheduler thread
+    agent = models.get('orchestrator').orchestrator_agent
+    batch_fn = getattr(agent, 'is_transactional_batch', None)
+    if batch_fn is not None:
+        return list(batch_fn([query for query, _ in items], [lang for _, lang in items]))
+    return [agent.is_transactional(query, lang) for query, lang in items]
+
+
+def encode_queries_batch(texts):
+    return list(encode_texts(texts, encoder=models.get('faq_encoder')))
+
+
+# Micro-batching of concurrent intent detection and query embedding calls from request threads:
+# a batch runs when VISTA_BATCH_MAX_SIZE calls are queued or the oldest waited VISTA_BATCH_MAX_WAIT_MS.
+# VISTA_BATCH_MAX_WAIT_MS=0 never waits: each batch is whatever queued up while the previous one ran
+BATCH_MAX_SIZE = int(os.environ.get('VISTA_BATCH_MAX_SIZE', 32))
+BATCH_MAX_WAIT_MS = float(os.environ.get('VISTA_BATCH_MAX_WAIT_MS', 8))
+intent_scheduler = BatchScheduler(classify_transactional_batch, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, name='intent')
+embedding_scheduler = BatchScheduler(encode_queries_batch, BATCH_MAX_SIZE, BATCH_MAX_WAIT_MS, name='embedding')
+
+# Keyword / script fast path in front of detect_language and is_transactional for bot turns.
+# The models are only used below VISTA_FAST_PATH_THRESHOLD confidence (set it above 1 to always use them)
+tiered_classifier = TieredClassifier(
+    detect_language,
+    lambda text, lang: intent_scheduler((text, lang)),
+    threshold=float(os.environ.get('VISTA_FAST_PATH_THRESHOLD', 0.8))
+)
+
+
+def parse_after_seq(after_seq):
+    # Optional 'after_seq' cursor sent by the fetch / stream endpoints; returns None if invalid
+    if after_seq is None:
+        return 0
+    try:
+        after_seq = int(after_seq)
+    except (TypeError, ValueError):
+        return None
+    return after_seq if after_seq >= 0 else None
+
+
+def refresh_faq_index():
+    # Every FAQ_VERSION_CHECK_SECONDS, look for a rebuilt FAQ index (new manifest version) in a
+    # background thread. Requests keep using the current index until the new one is swapped in.
+    global faq_version_checked_at
+    if faq_index is None or time.time() - faq_version_checked_at < FAQ_VERSION_CHECK_SECONDS:
+        return
+    if not faq_reload_lock.acquire(blocking=False):
+        return # Another request already started the check
+    faq_version_checked_at = time.time()
+    threading.Thread(target=reload_faq_index, name='faq-index-reload', daemon=True).start()
+
+
+def reload_faq_index():
+    # Runs with faq_reload_lock held. Loading the new index (training ivf / hnsw structures if
+    # needed) and its encoder happens here, off the request path; then the index is swapped in
+    # and the answers cached for the old one are dropped.
+    global faq_index
+    try:
+        if faq_index.current_version() == faq_index.version:
+            return
+        new_index = FaqIndex.load(FAQ_INDEX_DIR, FAQ_SEARCH_ENGINE, **FAQ_SEARCH_PARAMS)
+        if new_index.model_name != faq_index.model_name:
+            # Query embeddings must come from the model the new index was built with
+            encoder = get_encoder(new_index.model_name)
+            models.register('faq_encoder', lambda: encoder)
+            models.get('faq_encoder')
+        faq_index = new_index
+        answer_cache.set_version(new_index.version)
+        print(f"Reloaded FAQ index version {new_index.version} (model {new_index.model_name})")
+    except Exception as e:
+        print(f"Could not reload FAQ index: {e}")
+    finally:
+        faq_reload_lock.release()
+
+
+@tracer.traced('get_best_answer')
+def find_best_answer(user_message, lang):
+    # Same result shape as get_best_answer: {'translated_answer': ...} or {} when nothing matches
+    refresh_faq_index()
+    result = answer_cache.get_answer(user_message, lang)
+    if result is not None:
+        return result
+
+    if faq_index is None:
+        result = get_best_answer(user_message, source_lang=lang)
+        answer_cache.put_answer(user_message, lang, result)
+        return result
+
+    index = faq_index
+    # FAQ questions are in English, translate the query there and the answer back
+    query = user_message if lang == 'en' else translate_traced(user_message, source=lang, target='en')
+    query_embedding = answer_cache.embed(query, embedding_scheduler)
+    result = answer_cache.get_similar_answer(query_embedding, lang)
+    if result is None:
+        matches = index.search(query_embedding, k=1)
+        if not matches or matches[0][1] < FAQ_MIN_SCORE:
+            result = {}
+        else:
+            row, score = matches[0]
+            entry = index.entries[row]
+            answer = entry['answer']
+            translated_answer = answer if lang == 'en' else translate_traced(answer, source='en', target=lang)
+            result = {'question': entry['question'], 'answer': answer, 'translated_answer': translated_answer, 'score': score}
+    answer_cache.put_answer(user_message, lang, result, query_embedding)
+    return result
+
+
+@tracer.traced('orchestrate_transaction')
+def orchestrate_transaction(original_query, lang, customer_id, transaction_month):
+    return orchestrator_agent.orchestrate_transaction(original_query, lang, customer_id, transaction_month)
+
+
+def agent_message_view(msg):
+    # How a stored chat message is shown to the agent (always English)
+    if msg['sender'] == 'user': # These are customer messages
+        text = msg['translated_text'] # Agent gets English
+    elif msg['sender'] == 'agent': # These are agent's own messages
+        text = msg['original_text'] # Agent sees their original English message
+    elif msg['sender'] == 'bot': # Include bot messages for agent's context
+        text = msg['translated_text'] # Bot messages are already English
+    else:
+        return None
+    return {'sender': msg['sender'], 'text': text, 'time': msg['timestamp'], 'seq': msg['seq']}
+
+
+def customer_message_view(msg):
+    # How a stored chat message is shown to the customer (in their original language)
+    if msg['sender'] == 'agent': # These are agent messages
+        # Customer sees agent as 'bot' in their chat, in their original language
+        return {'sender': 'bot', 'text': msg['translated_text'], 'time': msg['timestamp'], 'seq': msg['seq']}
+    elif msg['sender'] == 'user': # These are customer's own messages
+        sender = 'user' # Customer sees their original message
+    elif msg['sender'] == 'bot': # Include bot messages for customer's context
+        sender = 'bot' # Bot messages are already in customer's original language
+    else:
+        return None
+    return {'sender': sender, 'text': msg['original_text'], 'time': msg['timestamp'], 'seq': msg['seq']}
+
+
+def publish_chat_message(customer_id, msg):
+    # Fan a newly stored chat message out to subscribed agents and the customer
+    event = {'customer_id': customer_id, 'message': msg}
+    message_broker.publish('agents', event)
+    message_broker.publish(f'agent:{customer_id}', event)
+    message_broker.publish(f'customer:{customer_id}', event)
+
+
+def sse_event(data, event_id=None):
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return "\n".join(lines) + "\n\n"
+
+
+def stream_chat(subscription, customer_id, after_seq, view, mark_read=False, session_id=None):
+    # Server-Sent Events generator for a single customer's chat. Messages after the
+    # client's cursor are sent first, then new ones whenever the broker signals one.
+    # The subscription is taken before the first read so nothing falls in between.
+    # Messages appended by other worker processes (shared state backend) are not published
+    # to this process's broker, so the chat is also re-read every STREAM_POLL_SECONDS.
+    # With session_id (the customer's own stream), every pass also counts as use of that
+    # session, so a customer who only listens to an agent isn't evicted as idle
+    # (VISTA_SESSION_IDLE_TTL) while still connected.
+    last_seq = after_seq
+    last_sent = time.monotonic()
+    try:
+        while True:
+            if session_id is not None:
+                session_contexts.get(session_id)
+            customer_chat = agent_customer_chats.get(customer_id)
+            if customer_chat is not None:
+                new_messages = customer_chat.messages_after(last_seq)
+                if mark_read:
+                    customer_chat.mark_read_by_agent(new_messages)
+                for msg in new_messages:
+                    message_view = view(msg)
+                    last_seq = msg['seq']
+                    if message_view is not None:
+                        yield sse_event(message_view, event_id=last_seq)
+                        last_sent = time.monotonic()
+            if subscription.closed:
+                break
+            event = subscription.get(timeout=STREAM_POLL_SECONDS)
+            if event is None and time.monotonic() - last_sent >= STREAM_KEEPALIVE_SECONDS:
+                yield ": keep-alive\n\n"
+                last_sent = time.monotonic()
+    finally:
+        subscription.close()
+
+
+def stream_agent_dashboard(subscription):
+    # Server-Sent Events generator for the agent dashboard: every new message in any chat
+    # handled by this process. With several workers, dashboards should also poll
+    # /get_active_customer_chats, which reads the shared state.
+    try:
+        while not subscription.closed:
+            event = subscription.get(timeout=STREAM_KEEPALIVE_SECONDS)
+            if event is None:
+                yield ": keep-alive\n\n"
+                continue
+            message_view = agent_message_view(event['message'])
+            if message_view is not None:
+                message_view['customer_id'] = event['customer_id']
+                yield sse_event(message_view)
+    finally:
+        subscription.close()
+
+
+def sse_response(stream):
+    return Response(stream, mimetype='text/event-stream', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no' # Don't let a reverse proxy buffer the stream
+    })
+
+
+@app.before_request
+def start_trace():
+    # Endpoints are labelled by route rule, so path parameters can't blow up the label set
+    tracer.start_request(request.url_rule.rule if request.url_rule else 'unmatched')
+
+
+@app.after_request
+def finish_trace(response):
+    trace = tracer.finish_request(response.status_code)
+    if trace is not None and trace.stages:
+        # Stage breakdown for the browser's network panel
+        response.headers['Server-Timing'] = ', '.join(
+            f"{stage};dur={1000 * seconds:.1f}" for stage, seconds in trace.stages
+        )
+    return response
+
+
+@app.teardown_request
+def discard_trace(error=None):
+    # Requests that failed before after_request still count, as 500s
+    if tracer.current() is not None:
+        tracer.finish_request(500)
+
+
+def component_metrics():
+    # Scheduler, cache, classifier and store statistics for /metrics: [(name, type, help, [(labels, value)])]
+    schedulers = [(scheduler.name, scheduler.stats()) for scheduler in (intent_scheduler, embedding_scheduler)]
+    answers = answer_cache.stats()
+    translations = translation_cache.stats()
+    model_status = models.status()
+    metrics = [
+        ('vista_batch_queue_depth', 'gauge', "Items waiting in a micro-batching queue.",
+         [({'scheduler': name}, stats['queue_depth']) for name, stats in schedulers]),
+        ('vista_batch_items_total', 'counter', "Items submitted to a micro-batching scheduler.",
+         [({'scheduler': name}, stats['submitted']) for name, stats in schedulers]),
+        ('vista_batch_batches_total', 'counter', "Batches run by a micro-batching scheduler.",
+         [({'scheduler': name}, stats['batches']) for name, stats in schedulers]),
+        ('vista_batch_mean_queue_wait_seconds', 'gauge', "Mean time items waited for their batch.",
+         [({'scheduler': name}, stats['mean_queue_wait_ms'] / 1000) for name, stats in schedulers]),
+        ('vista_answer_cache_hits_total', 'counter', "Answer cache hits by level.",
+         [({'level': 'answer'}, answers['answer_hits']), ({'level': 'embedding'}, answers['embedding_hits']),
+          ({'level': 'near_duplicate'}, answers['near_duplicate_hits'])]),
+        ('vista_answer_cache_misses_total', 'counter', "Answer cache misses by level.",
+         [({'level': 'answer'}, answers['answer_misses']), ({'level': 'embedding'}, answers['embedding_misses'])]),
+        ('vista_translation_cache_hits_total', 'counter', "Translation cache hits.", [({}, translations['hits'])]),
+        ('vista_translation_cache_misses_total', 'counter', "Translation cache misses.", [({}, translations['misses'])]),
+        ('vista_translation_cache_entries', 'gauge', "Translations held in memory.", [({}, translations['entries'])]),
+        ('vista_classifier_decisions_total', 'counter', "Language / intent decisions by tier.",
+         [({'tier': tier}, count) for tier, count in tiered_classifier.stats().items()]),
+        ('vista_stream_subscribers', 'gauge', "Open Server-Sent Events subscriptions in this process.",
+         [({}, message_broker.subscriber_count())]),
+        ('vista_sessions', 'gauge', "Live session contexts.", [({}, len(session_contexts))]),
+        ('vista_active_chats', 'gauge', "Active agent-customer chats.", [({}, len(agent_customer_chats))]),
+        ('vista_model_ready', 'gauge', "1 when the backend model is loaded.",
+         [({'model': name}, int(status['state'] == 'ready')) for name, status in model_status.items()]),
+    ]
+    if transaction_store is not None:
+        transactions = transaction_store.stats()
+        metrics += [
+            ('vista_transaction_cache_hits_total', 'counter', "Transaction summary cache hits.", [({}, transactions['hits'])]),
+            ('vista_transaction_cache_misses_total', 'counter', "Transaction summary cache misses.", [({}, transactions['misses'])]),
+            ('vista_transaction_cache_stale_total', 'counter', "Cached transaction summaries dropped after a write.", [({}, transactions['stale'])]),
+        ]
+    return metrics
+
+
+@app.route('/chat', methods=['POST'])
+def chat():
+    user_message = request.json.get('message')
+    session_id = request.json.get('session_id')
+    is_agent_chat = request.json.get('is_agent_chat', False)
+    sender_type = request.json.get('sender_type') # 'customer' or 'agent'
+    customer_id_for_agent = request.json.get('customer_id') # Only sent by agent
+
+    if not session_id:
+        session_id = str(uuid.uuid4())
+    
+    # Initialize context for this session if it doesn't exist
+    if session_id not in session_contexts:
+        session_contexts[session_id] = new_context()
+    
+    current_context = session_contexts[session_id]
+
+    if not user_message:
+        return jsonify({"error": "No message provided", "session_id": session_id}), 400
+
+    current_time = time.strftime('%H:%M')
+
+    if is_agent_chat:
+        # This is a message exchanged between a customer and an agent
+        # Determine the target customer ID for this chat
+        target_customer_id = customer_id_for_agent if sender_type == 'agent' else current_context.get('customer_id')
+        
+        if not target_customer_id:
+            return jsonify({"error": "Customer ID missing for agent chat", "session_id": session_id}), 400
+
+        # Ensure a chat entry exists for this customer ID
+        customer_chat = agent_customer_chats.get_or_create(target_customer_id)
+
+        if sender_type == 'customer':
+            # Customer sending message to agent
+            with tracer.stage('detect_language'):
+                detected_lang = detect_language(user_message)
+            
+            # Update the customer's original language in their session context
+            # Find the session context associated with this customer_id
+            found_session_id = session_contexts.find_session(target_customer_id)
+            if found_session_id:
+                session_contexts.update(found_session_id, customer_original_lang=detected_lang)
+            else:
+                # Fallback: if session_id for this customer_id isn't found,
+                # create a temporary context or use the current session_id
+                # This handles cases where customer might refresh or session is lost
+                session_contexts.update(
+                    session_id,
+                    customer_id=target_customer_id,
+                    is_connected_to_agent=True,
+                    customer_original_lang=detected_lang
+                )
+
+
+            translated_to_english = translate_traced(user_message, source=detected_lang, target='en')
+            
+            message_obj = {
+                'sender': 'user', # In the agent's view, this is 'user' (customer)
+                'original_text': user_message,
+                'translated_text': translated_to_english, # English for agent
+                'lang': detected_lang,
+                'timestamp': current_time,
+                'read_by_agent': False # New message, not yet read by agent
+            }
+            message_obj = customer_chat.append(message_obj)
+            publish_chat_message(target_customer_id, message_obj)
+            print(f"Customer message received for agent ({target_customer_id}): {user_message} (Original Lang: {detected_lang}) -> {translated_to_english} (English)")
+            return jsonify({"status": "Message sent to agent", "session_id": session_id})
+
+        elif sender_type == 'agent':
+            # Agent sending message to customer
+            # Find the customer's original language from session_contexts using target_customer_id
+            # Defaults to English, assume agent types in English.
+            customer_lang = session_contexts.customer_lang(target_customer_id, default='en')
+            
+            translated_to_customer_lang = translate_traced(user_message, source='en', target=customer_lang)
+            
+            message_obj = {
+                'sender': 'agent',
+                'original_text': user_message,
+                'translated_text': translated_to_customer_lang, # In customer's language
+                'lang': 'en', # Agent's input language
+                'timestamp': current_time
+            }
+            message_obj = customer_chat.append(message_obj)
+            publish_chat_message(target_customer_id, message_obj)
+            print(f"Agent message received for customer ({target_customer_id}): {user_message} (Agent Input) -> {translated_to_customer_lang} (Customer Lang: {customer_lang})")
+            return jsonify({"status": "Message sent to customer", "session_id": session_id})
+        else:
+            return jsonify({"error": "Invalid sender type for agent chat", "session_id": session_id}), 400
+
+    else:
+        # This is a customer-bot interaction
+        # Replies to the customer ID / month prompts keep the language memoized for the session
+        awaiting_reply = current_context['awaiting_customer_id'] or current_context['awaiting_transaction_month']
+        with tracer.stage('detect_language'):
+            lang = tiered_classifier.detect_language(
+                user_message,
+                session_lang=current_context.get('customer_original_lang'),
+                reuse_session_lang=awaiting_reply
+            )
+        current_context = session_contexts.update(session_id, customer_original_lang=lang) # Store initial customer language
+        
+        # Existing bot logic
+        try:
+            if current_context['awaiting_customer_id']:
+                session_contexts.update(
+                    session_id,
+                    customer_id=user_message.strip(),
+                    awaiting_customer_id=False,
+                    awaiting_transaction_month=True
+                )
+                bot_response = "Thank you. Please enter the transaction month (e.g., 2024-05):"
+            
+            elif current_context['awaiting_transaction_month']:
+                current_context = session_contexts.update(
+                    session_id,
+                    transaction_month=user_message.strip(),
+                    awaiting_transaction_month=False
+                )
+                
+                original_query = current_context['user_query_for_orchestration']
+                customer_id = current_context['customer_id']
+                transaction_month = current_context['transaction_month']
+
+                if original_query and customer_id and transaction_month:
+                    print(f"[Orchestrator AI Agent Activated for session {session_id}]")
+                    print(f"User Query: {original_query}, Customer ID: {customer_id}, Month: {transaction_month}")
+                    orchestration_result = orchestrate_transaction(
+                        original_query, lang, customer_id, transaction_month
+                    )
+                    bot_response = orchestration_result
+                    # Clear context after successful orchestration
+                    session_contexts[session_id] = new_context(
+                        customer_id=customer_id,
+                        customer_original_lang=lang,
+                        customer_name=current_context.get('customer_name', 'Customer')
+                    )
+                else:
+                    bot_response = "I seem to have lost track of our conversation. Please start your query again."
+                    # Clear context due to inconsistency
+                    session_contexts[session_id] = new_context(
+                        customer_id=None,
+                        customer_original_lang=lang,
+                        customer_name=current_context.get('customer_name', 'Customer')
+                    )
+            
+            else: # Initial query or non-transactional query
+                with tracer.stage('is_transactional'):
+                    is_transactional = tiered_classifier.is_transactional(user_message, lang)
+                if is_transactional:
+                    print(f"[Orchestrator AI Agent Detected Transactional Intent for session {session_id}]")
+                    session_contexts.update(
+                        session_id,
+                        awaiting_customer_id=True,
+                        user_query_for_orchestration=user_message # Store original query
+                    )
+                    bot_response = "I can help with that! Please provide your Customer ID:"
+                else:
+                    # Fallback to semantic search for non-transactional queries
+                    result = find_best_answer(user_message, lang)
+                    bot_response = result.get('translated_answer', "I'm sorry, I couldn't find an answer to that.")
+                    # Ensure context is clean for non-transactional queries
+                    session_contexts[session_id] = new_context(
+                        customer_id=None,
+                        customer_original_lang=lang,
+                        customer_name=current_context.get('customer_name', 'Customer')
+                    )
+
+        except Exception as e:
+            print(f"Error processing message with backend: {e}")
+            bot_response = "I apologize, but I encountered an error. Please try again later."
+            # Clear context on error to prevent being stuck
+            session_contexts[session_id] = new_context(
+                customer_id=None,
+                customer_original_lang=lang,
+                customer_name=current_context.get('customer_name', 'Customer')
+            )
+
+        return jsonify({"response": bot_response, "session_id": session_id})
+
+# New endpoint for agent to fetch messages for a specific customer
+@app.route('/get_agent_messages', methods=['POST'])
+def get_agent_messages():
+    customer_id = request.json.get('customer_id')
+    if not customer_id:
+        return jsonify({"error": "Customer ID required"}), 400
+
+    # Scroll-back: with 'before_seq', return up to 'limit' older messages instead (loaded from the archive if needed)
+    if request.json.get('before_seq') is not None:
+        return get_agent_history(customer_id, request.json.get('before_seq'), request.json.get('limit', 50))
+
+    # Only return messages newer than the client's cursor (all messages if not given)
+    after_seq = parse_after_seq(request.json.get('after_seq'))
+    if after_seq is None:
+        return jsonify({"error": "after_seq must be a non-negative integer"}), 400
+
+    messages_for_agent = []
+    last_seq = after_seq
+    customer_chat = agent_customer_chats.get(customer_id)
+    if customer_chat is not None:
+        new_messages = customer_chat.messages_after(after_seq)
+        for msg in new_messages:
+            message_view = agent_message_view(msg)
+            if message_view is not None:
+                messages_for_agent.append(message_view)
+        customer_chat.mark_read_by_agent(new_messages) # Mark as read when agent fetches
+        last_seq = max(last_seq, customer_chat.last_seq)
+    return jsonify({"messages": messages_for_agent, "last_seq": last_seq})
+
+def get_agent_history(customer_id, before_seq, limit):
+    before_seq = parse_after_seq(before_seq)
+    if not before_seq:
+        return jsonify({"error": "before_seq must be a positive integer"}), 400
+    if not isinstance(limit, int) or not 0 < limit <= MAX_HISTORY_PAGE:
+        return jsonify({"error": f"limit must be between 1 and {MAX_HISTORY_PAGE}"}), 400
+
+    messages_for_agent = []
+    first_seq = before_seq
+    has_more = False
+    customer_chat = agent_customer_chats.get(customer_id)
+    if customer_chat is not None:
+        older_messages = customer_chat.messages_before(before_seq, limit)
+        for msg in older_messages:
+            message_view = agent_message_view(msg)
+            if message_view is not None:
+                messages_for_agent.append(message_view)
+        customer_chat.mark_read_by_agent(older_messages)
+        if older_messages:
+            first_seq = older_messages[0]['seq']
+            has_more = first_seq > 1
+    return jsonify({"messages": messages_for_agent, "first_seq": first_seq, "has_more": has_more})
+
+# New endpoint for customer to fetch messages
+@app.route('/get_customer_messages', methods=['POST'])
+def get_customer_messages():
+    session_id = request.json.get('session_id')
+    if not session_id:
+        return jsonify({"error": "Session ID required"}), 400
+
+    customer_id = session_contexts[session_id].get('customer_id')
+    if not customer_id:
+        return jsonify({"error": "Customer ID not found for session"}), 400
+
+    # Only return messages newer than the client's cursor (all messages if not given)
+    after_seq = parse_after_seq(request.json.get('after_seq'))
+    if after_seq is None:
+        return jsonify({"error": "after_seq must be a non-negative integer"}), 400
+
+    messages_for_customer = []
+    last_seq = after_seq
+    customer_chat = agent_customer_chats.get(customer_id)
+    if customer_chat is not None:
+        for msg in customer_chat.messages_after(after_seq):
+            message_view = customer_message_view(msg)
+            if message_view is not None:
+                messages_for_customer.append(message_view)
+        last_seq = max(last_seq, customer_chat.last_seq)
+    return jsonify({"messages": messages_for_customer, "last_seq": last_seq})
+
+# New endpoint to initiate agent chat from customer side (sends initial history)
+@app.route('/initiate_agent_chat', methods=['POST'])
+def initiate_agent_chat():
+    session_id = request.json.get('session_id')
+    customer_name = request.json.get('customer_name')
+    customer_id = request.json.get('customer_id')
+    chat_history = request.json.get('chat_history') # List of {sender, text, time}
+
+    if not session_id or not customer_name or not customer_id or not chat_history:
+        return jsonify({"error": "Missing data for agent chat initiation"}), 400
+
+    # Ensure session context exists and set connected to agent
+    if session_id not in session_contexts:
+        session_contexts[session_id] = new_context(
+            customer_id=customer_id, # Set customer_id here
+            is_connected_to_agent=True,
+            customer_original_lang='en', # Will be updated by first customer message in history
+            customer_name=customer_name # Store customer name in session context
+        )
+    else:
+        session_contexts.update(
+            session_id,
+            is_connected_to_agent=True,
+            customer_id=customer_id,
+            customer_name=customer_name
+        )
+
+    # Initialize chat history for this customer in agent_customer_chats
+    customer_chat = agent_customer_chats.get_or_create(customer_id)
+    seq_before_history = customer_chat.last_seq
+
+    # Detect and translate all customer messages in the history in one batch
+    user_texts = [msg['text'] for msg in chat_history if msg['sender'] == 'user']
+    with tracer.stage('detect_language'):
+        detected_langs = detect_language_batch(user_texts)
+    with tracer.stage('translate_text'):
+        translated_user_texts = iter(zip(
+            detected_langs,
+            translate_batch(user_texts, detected_langs, target='en', cache=translation_cache)
+        ))
+    if detected_langs:
+        session_contexts.update(session_id, customer_original_lang=detected_langs[-1]) # Update customer's language
+
+    # Process and add existing chat history to agent_customer_chats
+    for msg in chat_history:
+        if msg['sender'] == 'user':
+            detected_lang, translated_to_english = next(translated_user_texts)
+            customer_chat.append({
+                'sender': 'user',
+                'original_text': msg['text'],
+                'translated_text': translated_to_english,
+                'lang': detected_lang,
+                'timestamp': msg['time'],
+                'read_by_agent': False # New message, not yet read by agent
+            })
+        elif msg['sender'] == 'bot':
+            # For bot messages in history, we store them as is for agent's reference
+            # No translation needed as they are already in English (from bot)
+            customer_chat.append({
+                'sender': 'bot', # Mark as bot message
+                'original_text': msg['text'],
+                'translated_text': msg['text'], # Bot messages are already English
+                'lang': 'en',
+                'timestamp': msg['time']
+            })
+        elif msg['sender'] == 'agent':
+            # If agent messages are in the customer's history (e.g., from a previous agent chat)
+            # We assume they were originally English when sent by agent
+            customer_chat.append({
+                'sender': 'agent',
+                'original_text': msg['text'], # Agent's original message
+                'translated_text': msg['text'], # Assume agent's message was in English
+                'lang': 'en',
+                'timestamp': msg['time']
+            })
+
+    # Push the transferred history to any agents already watching
+    for msg in customer_chat.messages_after(seq_before_history):
+        publish_chat_message(customer_id, msg)
+
+    print(f"Agent chat initiated for customer {customer_id}. History transferred.")
+    return jsonify({"status": "Agent chat initiated", "session_id": session_id})
+
+# New endpoint to get a summary of active customer chats for the agent dashboard sidebar
+@app.route('/get_active_customer_chats', methods=['GET'])
+def get_active_customer_chats():
+    active_chats_summary = []
+    for customer_id, customer_chat in agent_customer_chats.items():
+        # Try to find the customer's name from session_contexts, default to ID
+        customer_name = session_contexts.customer_name(customer_id, default=customer_id)
+
+        last_message = customer_chat.last_message()
+        last_message_text = "No messages"
+        last_message_time = ""
+
+        if last_message:
+            if last_message['sender'] == 'user':
+                last_message_text = last_message['translated_text'] # Agent sees customer's message in English
+            elif last_message['sender'] == 'agent':
+                last_message_text = last_message['original_text'] # Agent sees their own message in English
+            elif last_message['sender'] == 'bot':
+                last_message_text = last_message['translated_text'] # Agent sees bot's message in English
+            last_message_time = last_message['timestamp']
+
+        # Unread count for agent (only user messages not yet read by agent), kept up to date by the chat log
+        unread_count = customer_chat.unread_by_agent
+
+        active_chats_summary.append({
+            'id': customer_id,
+            'name': customer_name,
+            'avatar': '👤', # Default avatar
+            'lastMessage': last_message_text,
+            'lastTime': last_message_time,
+            'unread': unread_count
+        })
+    return jsonify({"chats": active_chats_summary})
+
+# Readiness probe for load balancers / rolling restarts: per-model load state
+# With lazy loading the process can serve before any model is loaded, so only failed loads make it unready
+@app.route('/ready', methods=['GET'])
+def ready():
+    model_status = models.status()
+    if MODEL_WARMUP == 'lazy':
+        is_ready = all(status['state'] != 'failed' for status in model_status.values())
+    else:
+        is_ready = models.is_ready()
+    return jsonify({"ready": is_ready, "warmup": MODEL_WARMUP, "models": model_status}), 200 if is_ready else 503
+
+# Prometheus scrape endpoint: request / stage latency histograms plus component statistics
+@app.route('/metrics', methods=['GET'])
+def metrics():
+    return Response(tracer.render(component_metrics()), mimetype='text/plain; version=0.0.4')
+
+# Server-Sent Events stream for agents, replaces polling /get_active_customer_chats and /get_agent_messages
+# Without customer_id: every new message in any chat (for the dashboard sidebar)
+# With customer_id: that customer's chat, starting after the after_seq cursor (or Last-Event-ID on reconnect)
+@app.route('/stream/agent', methods=['GET'])
+def stream_agent():
+    customer_id = request.args.get('customer_id')
+    if not customer_id:
+        return sse_response(stream_agent_dashboard(message_broker.subscribe('agents')))
+
+    after_seq = parse_after_seq(request.headers.get('Last-Event-ID', request.args.get('after_seq')))
+    if after_seq is None:
+        return jsonify({"error": "after_seq must be a non-negative integer"}), 400
+
+    subscription = message_broker.subscribe(f'agent:{customer_id}')
+    # Messages pushed to an agent with the chat open count as read, like /get_agent_messages
+    return sse_response(stream_chat(subscription, customer_id, after_seq, agent_message_view, mark_read=True))
+
+# Server-Sent Events stream for the customer's chat window, replaces polling /get_customer_messages
+@app.route('/stream/customer', methods=['GET'])
+def stream_customer():
+    session_id = request.args.get('session_id')
+    if not session_id:
+        return jsonify({"error": "Session ID required"}), 400
+
+    context = session_contexts.get(session_id)
+    customer_id = context.get('customer_id') if context else None
+    if not customer_id:
+        return jsonify({"error": "Customer ID not found for session"}), 400
+
+    after_seq = parse_after_seq(request.headers.get('Last-Event-ID', request.args.get('after_seq')))
+    if after_seq is None:
+        return jsonify({"error": "after_seq must be a non-negative integer"}), 400
+
+    subscription = message_broker.subscribe(f'customer:{customer_id}')
+    return sse_response(stream_chat(subscription, customer_id, after_seq, customer_message_view, session_id=session_id))
+
+
+if __name__ == '__main__':
+    app.run(debug=True, port=5000)
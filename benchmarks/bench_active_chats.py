@@ -0,0 +1,58 @@
+# Benchmark for /get_active_customer_chats as the number of live sessions grows.
+# The number of agent chats is fixed, only idle bot sessions are added, so the
+# time per dashboard poll should stay flat.
+#
+# Usage: python benchmarks/bench_active_chats.py
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stub_backend  # noqa: F401  (must be imported before app)
+import app as vista_app
+from chat_store import ChatStore
+from session_store import SessionStore, new_context
+
+ACTIVE_CHATS = 200
+SESSION_COUNTS = [1000, 5000, 20000, 50000]
+POLLS = 50
+
+
+def populate(session_count):
+    vista_app.session_contexts = SessionStore()
+    vista_app.agent_customer_chats = ChatStore()
+    for i in range(session_count):
+        customer_id = f"CUST{i:06d}" if i < ACTIVE_CHATS else None
+        vista_app.session_contexts[f"session-{i}"] = new_context(
+            customer_id=customer_id,
+            customer_name=f"Customer {i}",
+            is_connected_to_agent=customer_id is not None
+        )
+    for i in range(ACTIVE_CHATS):
+        vista_app.agent_customer_chats.get_or_create(f"CUST{i:06d}").append({
+            'sender': 'user',
+            'original_text': 'Hello',
+            'translated_text': 'Hello',
+            'lang': 'en',
+            'timestamp': '10:00',
+            'read_by_agent': False
+        })
+
+
+def main():
+    client = vista_app.app.test_client()
+    print(f"{'sessions':>10} {'chats':>6} {'ms/poll':>10}")
+    for session_count in SESSION_COUNTS:
+        populate(session_count)
+        client.get('/get_active_customer_chats')  # warm up
+        start = time.perf_counter()
+        for _ in range(POLLS):
+            response = client.get('/get_active_customer_chats')
+            assert len(response.get_json()['chats']) == ACTIVE_CHATS
+        elapsed_ms = (time.perf_counter() - start) * 1000 / POLLS
+        print(f"{session_count:>10} {ACTIVE_CHATS:>6} {elapsed_ms:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+# Benchmark harness for the FAQ search engines in search_engines.py.
+# Generates a clustered synthetic corpus of normalized embeddings (same size as
+# all-MiniLM-L6-v2 output) at several sizes and reports, for each engine configuration,
+# recall@k against exact search and p50 / p99 single-query latency.
+#
+# Usage: python benchmarks/bench_ann_search.py [corpus sizes ...]
+#        e.g. python benchmarks/bench_ann_search.py 10000 100000 300000
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from search_engines import ExactSearch, build_engine
+from faq_index import quantize_int8
+from latency_stats import percentile
+
+DIM = 384
+K = 10
+QUERIES = 200
+DEFAULT_SIZES = [10000, 100000]
+
+CONFIGS = [
+    ('exact', {}),
+    ('exact int8', {}),
+    ('ivf', {'n_probe': 4}),
+    ('ivf', {'n_probe': 16}),
+    ('ivf', {'n_probe': 64}),
+    ('ivf', {'n_probe': 16, 'pq_subvectors': 48, 'rerank': 100}),
+    ('hnsw', {'ef_search': 32}),
+    ('hnsw', {'ef_search': 128}),
+]
+
+
+def make_corpus(size, seed=0):
+    # Documents scattered around topic centres, like chunks of the same manuals / policies
+    rng = np.random.default_rng(seed)
+    topics = rng.standard_normal((max(size // 200, 10), DIM)).astype(np.float32)
+    vectors = topics[rng.integers(0, len(topics), size)] + 0.6 * rng.standard_normal((size, DIM)).astype(np.float32)
+    vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+    queries = vectors[rng.integers(0, size, QUERIES)] + 0.3 * rng.standard_normal((QUERIES, DIM)).astype(np.float32)
+    queries /= np.linalg.norm(queries, axis=1, keepdims=True)
+    return vectors, queries
+
+
+def run(name, engine, queries, truth):
+    latencies = []
+    hits = 0
+    for query, expected in zip(queries, truth):
+        start = time.perf_counter()
+        results = engine.search(query, K)
+        latencies.append((time.perf_counter() - start) * 1000)
+        hits += len(expected & {row for row, _ in results})
+    recall = hits / (len(queries) * K)
+    print(f"  {name:<45} recall@{K}: {recall:.3f}  p50: {percentile(latencies, 0.5):7.2f} ms  p99: {percentile(latencies, 0.99):7.2f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Recall and latency of the FAQ search engines")
+    parser.add_argument('sizes', type=int, nargs='*', default=DEFAULT_SIZES, help="corpus sizes to benchmark")
+    args = parser.parse_args()
+
+    for size in args.sizes:
+        vectors, queries = make_corpus(size)
+        exact = ExactSearch(vectors)
+        truth = [{row for row, _ in exact.search(query, K)} for query in queries]
+        quantized, scales = quantize_int8(vectors)
+        print(f"corpus: {size} x {DIM}")
+        for engine_name, params in CONFIGS:
+            label = f"{engine_name} {params}" if params else engine_name
+            try:
+                start = time.perf_counter()
+                if engine_name == 'exact int8':
+                    engine = build_engine('exact', quantized, scales)
+                else:
+                    engine = build_engine(engine_name, vectors, **params)
+                build_s = time.perf_counter() - start
+            except ImportError as e:
+                print(f"  {label:<45} skipped: {e}")
+                continue
+            if build_s > 0.01:
+                label += f" (built in {build_s:.1f}s)"
+            run(label, engine, queries, truth)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,237 @@
+# End-to-end benchmark of the Flask endpoints (mostly the /chat pipeline).
+# Replays the recorded conversation mix in benchmarks/data/conversations.jsonl against
+# app.py through the Flask test client from several threads, every replay with its own
+# session and customer ids ({session} / {customer} in the data), and reports p50/p95/p99
+# latency per endpoint, requests per second, and the per-stage breakdown recorded by the
+# request tracer (request_tracing.py), i.e. what /metrics exposes.
+#
+# The backend models are replaced by stub_backend.py with simulated latencies per call
+# (scaled by --delay-scale, 0 measures the app's own overhead only). A conversation's
+# "weight" is how many times it is replayed per round.
+#
+# Replaying the same conversations makes get_best_answer and translate_text mostly cache
+# hits, so there are two measured passes: 'warm' keeps the answer and translation caches
+# across rounds (a steady stream of repeated questions), 'cold' clears them before every
+# round (each round pays for its model calls again). --cache picks one of them.
+#
+# Usage: python benchmarks/bench_chat_pipeline.py [--threads 8] [--repeat 20] [--delay-scale 1.0]
+#                                                 [--cache both|warm|cold]
+#                                                 [--profile-sample-rate 0.05 --slow-ms 30]
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from latency_stats import percentile
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+DATA_FILE = os.path.join(BENCH_DIR, 'data', 'conversations.jsonl')
+
+# Simulated model latencies in seconds per call
+MODEL_DELAYS = {
+    'detect_language': 0.003,
+    'translate_text': 0.004,
+    'get_best_answer': 0.008,
+    'is_transactional': 0.003,
+    'orchestrate_transaction': 0.015,
+}
+
+
+def install_delays(scale):
+    # Wraps the stub backend functions so every model call takes MODEL_DELAYS[name] * scale
+    import stub_backend  # noqa: F401
+    language = sys.modules['backend.language']
+    semantic_search = sys.modules['backend.semantic_search']
+    agent = sys.modules['backend.orchestrator'].orchestrator_agent
+
+    def delayed(name, fn):
+        delay = MODEL_DELAYS[name] * scale
+        def wrapper(*args, **kwargs):
+            if delay:
+                time.sleep(delay)
+            return fn(*args, **kwargs)
+        return wrapper
+
+    language.detect_language = delayed('detect_language', language.detect_language)
+    language.translate_text = delayed('translate_text', language.translate_text)
+    semantic_search.get_best_answer = delayed('get_best_answer', semantic_search.get_best_answer)
+    agent.is_transactional = delayed('is_transactional', agent.is_transactional)
+    agent.orchestrate_transaction = delayed('orchestrate_transaction', agent.orchestrate_transaction)
+
+
+def import_app(args):
+    sys.path.insert(0, os.path.dirname(BENCH_DIR))
+    sys.path.insert(0, BENCH_DIR)
+    os.environ.setdefault('VISTA_MODEL_WARMUP', 'lazy')
+    os.environ['VISTA_SLOW_REQUEST_MS'] = str(args.slow_ms)
+    os.environ['VISTA_PROFILE_SAMPLE_RATE'] = str(args.profile_sample_rate)
+    install_delays(args.delay_scale)
+    import app
+    return app
+
+
+def load_conversations(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def fill(value, session_id, customer_id):
+    # Substitutes the {session} / {customer} placeholders anywhere in a request payload
+    if isinstance(value, str):
+        return value.replace('{session}', session_id).replace('{customer}', customer_id)
+    if isinstance(value, list):
+        return [fill(item, session_id, customer_id) for item in value]
+    if isinstance(value, dict):
+        return {key: fill(item, session_id, customer_id) for key, item in value.items()}
+    return value
+
+
+def replay(app, conversations, threads, repeat, seed):
+    # Returns ({endpoint: [seconds]}, error count, elapsed seconds)
+    plan = [conversation for conversation in conversations for _ in range(conversation.get('weight', 1))] * repeat
+    random.Random(seed).shuffle(plan)
+    latencies = {}
+    errors = []
+    next_index = [0]
+    lock = threading.Lock()
+
+    def worker():
+        client = app.app.test_client()
+        local = {}
+        while True:
+            with lock:
+                index = next_index[0]
+                next_index[0] += 1
+            if index >= len(plan):
+                break
+            conversation = plan[index]
+            session_id, customer_id = f"bench-{index:06d}", f"BENCH{index:06d}"
+            for step in conversation['steps']:
+                start = time.perf_counter()
+                if step.get('method') == 'GET':
+                    response = client.get(step['path'])
+                else:
+                    response = client.post(step['path'], json=fill(step['json'], session_id, customer_id))
+                local.setdefault(step['path'], []).append(time.perf_counter() - start)
+                if response.status_code != 200:
+                    errors.append((conversation['name'], step['path'], response.status_code))
+        with lock:
+            for path, values in local.items():
+                latencies.setdefault(path, []).extend(values)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return latencies, errors, time.perf_counter() - start
+
+
+def measure(app, conversations, args, cold):
+    # One measured pass; returns what the report needs, read before the next pass resets the tracer
+    app.tracer.reset()
+    answers_before, translations_before = app.answer_cache.stats(), app.translation_cache.stats()
+    if cold:
+        latencies, errors, elapsed = {}, [], 0.0
+        for round_index in range(args.repeat):
+            app.answer_cache.clear()
+            app.translation_cache.clear()
+            round_latencies, round_errors, round_elapsed = replay(
+                app, conversations, args.threads, 1, args.seed + 2 + round_index
+            )
+            for path, values in round_latencies.items():
+                latencies.setdefault(path, []).extend(values)
+            errors += round_errors
+            elapsed += round_elapsed
+    else:
+        latencies, errors, elapsed = replay(app, conversations, args.threads, args.repeat, args.seed)
+    answers, translations = app.answer_cache.stats(), app.translation_cache.stats()
+    stages = []
+    for stage, histogram in sorted(app.tracer.stage_seconds.items()):
+        _, count, seconds = histogram.snapshot()
+        stages.append((stage, count, seconds, histogram.quantile(0.95)))
+    return {
+        'latencies': latencies,
+        'errors': errors,
+        'elapsed': elapsed,
+        'stages': stages,
+        'answer_hits': answers['answer_hits'] - answers_before['answer_hits'],
+        'answer_misses': answers['answer_misses'] - answers_before['answer_misses'],
+        'translation_hits': translations['hits'] - translations_before['hits'],
+        'translation_misses': translations['misses'] - translations_before['misses'],
+        'slow_requests': app.tracer.slow_requests,
+        'profiled_requests': app.tracer.profiled_requests,
+        'slow_profiles': list(app.tracer.slow_profiles)
+    }
+
+
+def print_pass(name, result, args):
+    latencies, elapsed = result['latencies'], result['elapsed']
+    total = sum(len(values) for values in latencies.values())
+    print(f"\n== {name} caches: {total} requests in {elapsed:.2f}s: {total / elapsed:.0f} requests/s, "
+          f"{len(result['errors'])} errors")
+    print(f"answer cache hits {result['answer_hits']} / misses {result['answer_misses']}, "
+          f"translation cache hits {result['translation_hits']} / misses {result['translation_misses']}")
+    print(f"\n{'endpoint':<28} {'requests':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+    for path, values in sorted(latencies.items()):
+        print(f"{path:<28} {len(values):>9} {1000 * percentile(values, 0.5):>8.2f} "
+              f"{1000 * percentile(values, 0.95):>8.2f} {1000 * percentile(values, 0.99):>8.2f}")
+
+    # Stage histograms only give bucket bounds, so p95 is the bucket's upper bound
+    print(f"\n{'stage':<28} {'calls':>9} {'mean ms':>8} {'p95 ≤ ms':>8}")
+    for stage, count, seconds, p95 in result['stages']:
+        print(f"{stage:<28} {count:>9} {1000 * seconds / max(count, 1):>8.2f} {1000 * p95:>8.1f}")
+
+    print(f"\nslow requests (>= {args.slow_ms:g} ms): {result['slow_requests']}, "
+          f"profiled: {result['profiled_requests']}, profiles kept: {len(result['slow_profiles'])}")
+    if result['slow_profiles']:
+        endpoint, seconds, text = result['slow_profiles'][-1]
+        print(f"\nlast kept profile ({endpoint}, {1000 * seconds:.1f} ms):")
+        print('\n'.join(text.strip().splitlines()[:25]))
+    for conversation, path, status in result['errors'][:5]:
+        print(f"  ERROR {conversation}: {path} returned {status}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--data', default=DATA_FILE)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--repeat', type=int, default=20, help="rounds over the weighted conversation mix")
+    parser.add_argument('--delay-scale', type=float, default=1.0, help="multiplier for the simulated model latencies")
+    parser.add_argument('--cache', choices=['both', 'warm', 'cold'], default='both',
+                        help="keep the answer / translation caches across rounds (warm) or clear them every round (cold)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--slow-ms', type=float, default=1000, help="VISTA_SLOW_REQUEST_MS for the run")
+    parser.add_argument('--profile-sample-rate', type=float, default=0.0, help="VISTA_PROFILE_SAMPLE_RATE for the run")
+    args = parser.parse_args()
+
+    conversations = load_conversations(args.data)
+    passes = [name for name in ('warm', 'cold') if args.cache in (name, 'both')]
+    # The app's per-request logging is discarded, slow request lines are counted instead
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        app = import_app(args)
+        replay(app, conversations, args.threads, 1, args.seed + 1) # Warm-up round, not measured
+        results = [(name, measure(app, conversations, args, cold=name == 'cold')) for name in passes]
+        metrics = app.app.test_client().get('/metrics')
+
+    print(f"{len(conversations)} conversations x {args.repeat} rounds, {args.threads} threads, "
+          f"model delay scale {args.delay_scale}")
+    for name, result in results:
+        print_pass(name, result, args)
+
+    tiers = app.tiered_classifier.stats()
+    print("\nclassifier tiers: " + ', '.join(f"{tier} {count}" for tier, count in tiers.items()))
+    samples = [line for line in metrics.get_data(as_text=True).splitlines() if line and not line.startswith('#')]
+    print(f"/metrics: HTTP {metrics.status_code}, {len(samples)} samples")
+    sys.exit(1 if any(result['errors'] for _, result in results) else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+# Benchmark for the tiered language / intent classifier (intent_fast_path.py) on labelled
+# utterances, reported separately for two sets:
+#   tuning    benchmarks/data/utterances.jsonl, the examples the patterns were written against
+#   held-out  benchmarks/data/utterances_heldout.jsonl, never used to adjust the patterns (keep it
+#             that way: add new examples that led to a pattern change to the tuning set)
+#
+# Reports, per tier:
+#   - coverage: share of utterances the fast path answers without the model
+#   - accuracy of the fast path on the utterances it covers
+#   - mean latency per call
+# The model tier (backend.language.detect_language, orchestrator_agent.is_transactional)
+# is only timed with --real; by default it is reported as skipped and the tiered run
+# uses the labels as a stand-in model so accuracy and coverage can still be measured.
+#
+# Usage: python benchmarks/bench_fast_path.py [--real] [--threshold 0.8]
+import argparse
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from intent_fast_path import TieredClassifier, fast_detect_language, fast_is_transactional
+
+DATA_SETS = [
+    ('tuning', os.path.join(ROOT, 'benchmarks', 'data', 'utterances.jsonl')),
+    ('held-out', os.path.join(ROOT, 'benchmarks', 'data', 'utterances_heldout.jsonl')),
+]
+REPEAT = 200 # Timing repetitions of the fast path over the whole set
+
+
+def load_utterances(path):
+    with open(path, encoding='utf-8') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def mean_us(fn, items, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for item in items:
+            fn(item)
+    return (time.perf_counter() - start) * 1e6 / (repeat * len(items))
+
+
+def fast_path_report(utterances, threshold):
+    queries = [u for u in utterances if u['kind'] == 'query']
+    covered = correct = 0
+    for u in queries:
+        lang, confidence = fast_detect_language(u['text'])
+        if lang is not None and confidence >= threshold:
+            covered += 1
+            correct += lang == u['lang']
+    print(f"language  coverage {covered}/{len(queries)} ({100 * covered / len(queries):.0f}%)"
+          f"  accuracy on covered {100 * correct / max(covered, 1):.1f}%"
+          f"  {mean_us(lambda u: fast_detect_language(u['text']), queries, REPEAT):.1f} us/call")
+
+    covered = correct = 0
+    for u in queries:
+        result, confidence = fast_is_transactional(u['text'], u['lang'])
+        if confidence >= threshold:
+            covered += 1
+            correct += result == u['transactional']
+    print(f"intent    coverage {covered}/{len(queries)} ({100 * covered / len(queries):.0f}%)"
+          f"  accuracy on covered {100 * correct / max(covered, 1):.1f}%"
+          f"  {mean_us(lambda u: fast_is_transactional(u['text'], u['lang']), queries, REPEAT):.1f} us/call")
+
+
+def tiered_report(utterances, threshold, detect_language_fn, is_transactional_fn):
+    # Replays every utterance as a bot turn: replies to the bot's prompts reuse the
+    # session language, queries go through both classifiers
+    classifier = TieredClassifier(detect_language_fn, is_transactional_fn, threshold)
+    lang_correct = intent_correct = queries = 0
+    start = time.perf_counter()
+    for u in utterances:
+        if u['kind'] == 'reply':
+            lang = classifier.detect_language(u['text'], session_lang=u['lang'], reuse_session_lang=True)
+            lang_correct += lang == u['lang']
+            continue
+        queries += 1
+        lang = classifier.detect_language(u['text'])
+        lang_correct += lang == u['lang']
+        intent_correct += classifier.is_transactional(u['text'], lang) == u['transactional']
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    print(f"tiered    language accuracy {100 * lang_correct / len(utterances):.1f}%"
+          f"  intent accuracy {100 * intent_correct / queries:.1f}%"
+          f"  {elapsed_ms / len(utterances):.3f} ms/utterance")
+    print(f"          tier counts {classifier.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--real', action='store_true', help="time the backend models as tier 2")
+    parser.add_argument('--threshold', type=float, default=0.8)
+    args = parser.parse_args()
+
+    if args.real:
+        from backend.language import detect_language
+        from backend.orchestrator import orchestrator_agent
+
+    for name, path in DATA_SETS:
+        utterances = load_utterances(path)
+        print(f"{name}: {len(utterances)} utterances, threshold {args.threshold}")
+        fast_path_report(utterances, args.threshold)
+
+        if args.real:
+            queries = [u for u in utterances if u['kind'] == 'query']
+            print(f"model     language {mean_us(lambda u: detect_language(u['text']), queries, 1) / 1000:.1f} ms/call"
+                  f"  intent {mean_us(lambda u: orchestrator_agent.is_transactional(u['text'], u['lang']), queries, 1) / 1000:.1f} ms/call")
+            tiered_report(utterances, args.threshold, detect_language, orchestrator_agent.is_transactional)
+        else:
+            print("model     skipped (pass --real to time backend.language / backend.orchestrator)")
+            labels = {u['text']: u for u in utterances}
+            tiered_report(
+                utterances, args.threshold,
+                lambda text: labels[text]['lang'],
+                lambda text, lang: labels[text]['transactional']
+            )
+        print()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,106 @@
+# Benchmark for the /initiate_agent_chat history transfer: per-message detect_language +
+# translate_text calls versus detect_language_batch + translate_batch.
+#
+# By default the backend models are replaced by a simulated CPU model with a fixed cost
+# per forward pass plus a smaller cost per item in the batch. Pass --real to use the
+# actual backend.language models instead.
+#
+# Usage: python benchmarks/bench_handoff_batching.py [--real]
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+REAL = '--real' in sys.argv
+if not REAL:
+    import stub_backend  # noqa: F401
+
+from backend import language
+import language_batch
+
+HISTORY_SIZES = [10, 50, 200]
+PASS_OVERHEAD_S = 0.015 # Simulated fixed cost of one model forward pass
+ITEM_COST_S = 0.002 # Simulated cost per text inside a forward pass
+
+SAMPLE_MESSAGES = [
+    ("What is my account balance?", 'en'),
+    ("मेरे खाते में कितना पैसा है?", 'hi'),
+    ("Show my transactions for last month", 'en'),
+    ("என் கணக்கு இருப்பு என்ன?", 'ta'),
+    ("I want to block my debit card", 'en'),
+    ("मुझे अपना पिन बदलना है", 'hi'),
+]
+LANG_BY_TEXT = dict(SAMPLE_MESSAGES)
+
+
+def simulated_forward(batch_size):
+    time.sleep(PASS_OVERHEAD_S + ITEM_COST_S * batch_size)
+
+
+def simulated_detect_language(text):
+    simulated_forward(1)
+    return LANG_BY_TEXT.get(text.split(' #')[0], 'en')
+
+
+def simulated_translate_text(text, source='en', target='en'):
+    simulated_forward(1)
+    return f"[{source}->{target}] {text}"
+
+
+def simulated_detect_language_batch(texts):
+    simulated_forward(len(texts))
+    return [LANG_BY_TEXT.get(text.split(' #')[0], 'en') for text in texts]
+
+
+def simulated_translate_batch(texts, source='en', target='en'):
+    simulated_forward(len(texts))
+    return [f"[{source}->{target}] {text}" for text in texts]
+
+
+def make_history(size):
+    # Alternating customer / bot turns, every customer message unique
+    history = []
+    for i in range(size):
+        if i % 2 == 0:
+            text, _ = SAMPLE_MESSAGES[(i // 2) % len(SAMPLE_MESSAGES)]
+            history.append({'sender': 'user', 'text': f"{text} #{i}", 'time': '10:00'})
+        else:
+            history.append({'sender': 'bot', 'text': "Here is what I found.", 'time': '10:00'})
+    return history
+
+
+def per_message(history):
+    for msg in history:
+        if msg['sender'] == 'user':
+            detected_lang = language.detect_language(msg['text'])
+            language.translate_text(msg['text'], source=detected_lang, target='en')
+
+
+def batched(history):
+    user_texts = [msg['text'] for msg in history if msg['sender'] == 'user']
+    detected_langs = language_batch.detect_language_batch(user_texts)
+    language_batch.translate_batch(user_texts, detected_langs, target='en')
+
+
+def main():
+    if not REAL:
+        language.detect_language = simulated_detect_language
+        language.translate_text = simulated_translate_text
+        language.detect_language_batch = simulated_detect_language_batch
+        language.translate_batch = simulated_translate_batch
+    print(f"backend: {'real models' if REAL else 'simulated CPU model'}")
+    print(f"{'history':>8} {'per-message ms':>15} {'batched ms':>11} {'speedup':>8}")
+    for size in HISTORY_SIZES:
+        history = make_history(size)
+        start = time.perf_counter()
+        per_message(history)
+        per_message_ms = (time.perf_counter() - start) * 1000
+        start = time.perf_counter()
+        batched(history)
+        batched_ms = (time.perf_counter() - start) * 1000
+        print(f"{size:>8} {per_message_ms:>15.1f} {batched_ms:>11.1f} {per_message_ms / batched_ms:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
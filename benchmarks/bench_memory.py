@@ -0,0 +1,159 @@
+# Memory benchmark for the session and chat storage (session_store.py, chat_store.py).
+# Simulates a day of traffic on a simulated clock: customers arrive evenly over 24 hours,
+# talk to the bot for a few turns, and a share of them are handed over to an agent for a
+# longer chat. Each storage mode runs in its own process and reports its peak RSS:
+#   baseline  plain dicts per message, nothing ever removed (the original globals)
+#   slots     ChatMessage records, nothing ever removed
+#   bounded   ChatMessage records, idle TTL eviction and older turns archived to SQLite
+#
+# Usage: python benchmarks/bench_memory.py [--customers 20000] [--agent-share 0.3]
+import argparse
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from chat_store import ChatArchive, ChatStore
+from session_store import SessionStore, new_context
+
+DAY_SECONDS = 24 * 3600
+MODES = ['baseline', 'slots', 'bounded']
+IDLE_TTL_SECONDS = 3600
+MAX_IN_MEMORY = 200
+BOT_TURNS = 6
+AGENT_MESSAGES = 60
+
+CUSTOMER_TEXTS = [
+    "I was charged twice for the same transaction at the grocery store yesterday, can you check?",
+    "मेरे खाते से पैसे कट गए लेकिन एटीएम से नकद नहीं निकला, कृपया मदद करें",
+    "Can you tell me why my debit card was declined when I tried to pay online this morning?",
+    "என் கணக்கில் இருந்து தவறான தொகை பிடிக்கப்பட்டது, தயவுசெய்து சரிபார்க்கவும்",
+]
+AGENT_TEXTS = [
+    "I can see the duplicate charge on your account, I have raised a dispute for the second one.",
+    "The refund usually takes three to five working days to appear in your statement.",
+    "Could you please confirm the last four digits of the card you used for this payment?",
+]
+
+
+class BaselineChats:
+    # The original storage: customer_id -> list of message dicts
+    def __init__(self):
+        self.chats = {}
+
+    def append(self, customer_id, message):
+        messages = self.chats.setdefault(customer_id, [])
+        message['seq'] = len(messages) + 1
+        messages.append(message)
+
+
+def simulate(mode, customers, agent_share, seed=0):
+    rng = random.Random(seed)
+    now = [0.0]
+    clock = lambda: now[0]
+    archive = None
+    if mode == 'bounded':
+        archive = ChatArchive()
+        sessions = SessionStore(idle_ttl_seconds=IDLE_TTL_SECONDS, clock=clock)
+        chats = ChatStore(archive, max_in_memory=MAX_IN_MEMORY, idle_ttl_seconds=IDLE_TTL_SECONDS, clock=clock)
+    else:
+        sessions = SessionStore()
+        chats = BaselineChats() if mode == 'baseline' else ChatStore()
+
+    def add_message(customer_id, message):
+        if mode == 'baseline':
+            chats.append(customer_id, message)
+        else:
+            chats.get_or_create(customer_id).append(message)
+
+    start = time.perf_counter()
+    for i in range(customers):
+        now[0] = i * DAY_SECONDS / customers
+        session_id = f"session-{i:07d}"
+        customer_id = f"CUST{i:07d}"
+        sessions[session_id] = new_context(customer_name=f"Customer {i}")
+        for _ in range(BOT_TURNS):
+            sessions.update(session_id, user_query_for_orchestration=rng.choice(CUSTOMER_TEXTS))
+        sessions.update(session_id, customer_id=customer_id)
+        if rng.random() >= agent_share:
+            continue
+        sessions.update(session_id, is_connected_to_agent=True)
+        for turn in range(AGENT_MESSAGES):
+            timestamp = f"{int(now[0] // 3600) % 24:02d}:{int(now[0] // 60) % 60:02d}"
+            if turn % 2 == 0:
+                text = rng.choice(CUSTOMER_TEXTS)
+                message = {'sender': 'user', 'original_text': text, 'translated_text': f"[en] {text}",
+                           'lang': 'hi', 'timestamp': timestamp, 'read_by_agent': False}
+            else:
+                text = rng.choice(AGENT_TEXTS)
+                message = {'sender': 'agent', 'original_text': text, 'translated_text': f"[hi] {text}",
+                           'lang': 'en', 'timestamp': timestamp}
+            add_message(customer_id, message)
+    elapsed = time.perf_counter() - start
+
+    live_chats = len(chats.chats) if mode == 'baseline' else len(chats)
+    result = {
+        'mode': mode,
+        'peak_rss_mb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        'seconds': elapsed,
+        'live_sessions': len(sessions),
+        'live_chats': live_chats,
+        'archive_mb': 0.0
+    }
+    if archive is not None:
+        # Scroll back to the very beginning of an evicted chat
+        customer_id = next(f"CUST{i:07d}" for i in range(customers) if archive.last_seq(f"CUST{i:07d}"))
+        start = time.perf_counter()
+        page = chats.get_or_create(customer_id).messages_before(AGENT_MESSAGES + 1, limit=50)
+        result['scroll_back_ms'] = (time.perf_counter() - start) * 1000
+        assert page and page[-1].seq == AGENT_MESSAGES, "scroll-back did not return the archived messages"
+        chat = chats.get_or_create(customer_id)
+        past_end = chat.messages_before(10 ** 6, limit=50)
+        assert [msg.seq for msg in past_end] == [msg.seq for msg in page], "scroll-back past the newest message lost messages"
+        # Two overlapping agent fetches of the archived messages count each read once
+        first_fetch, second_fetch = chat.messages_after(0), chat.messages_after(0)
+        chat.mark_read_by_agent(first_fetch)
+        chat.mark_read_by_agent(second_fetch)
+        assert chat.unread_by_agent == 0 == archive.unread_count(customer_id), "overlapping reads miscounted unread messages"
+        result['archive_mb'] = sum(
+            os.path.getsize(archive.db_path + suffix)
+            for suffix in ('', '-wal') if os.path.exists(archive.db_path + suffix)
+        ) / 2 ** 20
+        archive.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--customers', type=int, default=20000)
+    parser.add_argument('--agent-share', type=float, default=0.3)
+    parser.add_argument('--mode', choices=MODES, help=argparse.SUPPRESS) # Child process
+    args = parser.parse_args()
+
+    if args.mode:
+        result = simulate(args.mode, args.customers, args.agent_share)
+        print(' '.join(f"{key}={value}" for key, value in result.items()))
+        return
+
+    print(f"simulated day: {args.customers} customers, {args.agent_share:.0%} handed to an agent "
+          f"({AGENT_MESSAGES} messages each), idle TTL {IDLE_TTL_SECONDS}s, {MAX_IN_MEMORY} messages in memory per chat")
+    print(f"{'mode':<9} {'peak RSS MB':>12} {'sessions':>9} {'chats':>7} {'archive MB':>11} {'seconds':>8}")
+    for mode in MODES:
+        output = subprocess.run(
+            [sys.executable, __file__, '--mode', mode, '--customers', str(args.customers),
+             '--agent-share', str(args.agent_share)],
+            check=True, capture_output=True, text=True
+        ).stdout
+        result = dict(item.split('=', 1) for item in output.split())
+        print(f"{mode:<9} {float(result['peak_rss_mb']):>12.1f} {result['live_sessions']:>9} {result['live_chats']:>7} "
+              f"{float(result['archive_mb']):>11.1f} {float(result['seconds']):>8.1f}")
+        if 'scroll_back_ms' in result:
+            print(f"{'':<9} scroll-back of an evicted chat from the archive: {float(result['scroll_back_ms']):.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+# Concurrency benchmark for the micro-batching BatchScheduler (inference_scheduler.py).
+# Simulates a CPU model where every forward pass has a fixed cost plus a per-item cost and
+# concurrent passes contend for the same cores (one lock, like torch sharing its threads).
+# For several numbers of concurrent request threads it compares calling the model directly
+# with going through the scheduler, and prints throughput, latency and scheduler metrics.
+#
+# Usage: python benchmarks/bench_micro_batching.py [requests per thread]
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from inference_scheduler import BatchScheduler
+from latency_stats import percentile
+
+PASS_OVERHEAD_S = 0.004 # Simulated fixed cost of one forward pass
+ITEM_COST_S = 0.0005 # Simulated cost per item inside a forward pass
+CONCURRENCY = [1, 4, 16, 64]
+MAX_BATCH_SIZE = 32
+MAX_WAIT_MS = 8
+
+_model_lock = threading.Lock()
+
+
+def simulated_model(items):
+    with _model_lock:
+        time.sleep(PASS_OVERHEAD_S + ITEM_COST_S * len(items))
+    return [len(item) for item in items]
+
+
+def run(call, threads, requests_per_thread):
+    latencies = []
+    lock = threading.Lock()
+
+    def worker():
+        local = []
+        for i in range(requests_per_thread):
+            start = time.perf_counter()
+            call(f"what is my account balance {i}")
+            local.append((time.perf_counter() - start) * 1000)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    return len(latencies) / elapsed, statistics.median(latencies), percentile(latencies, 0.99)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Direct model calls vs. the micro-batching scheduler")
+    parser.add_argument('requests_per_thread', type=int, nargs='?', default=20)
+    requests_per_thread = parser.parse_args().requests_per_thread
+    print(f"{'threads':>7} {'mode':>9} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8}  scheduler")
+    for threads in CONCURRENCY:
+        rps, p50, p99 = run(lambda item: simulated_model([item])[0], threads, requests_per_thread)
+        print(f"{threads:>7} {'direct':>9} {rps:>8.0f} {p50:>8.1f} {p99:>8.1f}")
+        scheduler = BatchScheduler(simulated_model, MAX_BATCH_SIZE, MAX_WAIT_MS, name='bench')
+        rps, p50, p99 = run(scheduler, threads, requests_per_thread)
+        stats = scheduler.stats()
+        print(f"{threads:>7} {'batched':>9} {rps:>8.0f} {p50:>8.1f} {p99:>8.1f}  "
+              f"mean batch {stats['mean_batch_size']:.1f}, max queue depth {stats['max_queue_depth']}, "
+              f"mean queue wait {stats['mean_queue_wait_ms']:.1f} ms")
+
+
+if __name__ == '__main__':
+    main()
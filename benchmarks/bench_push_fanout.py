@@ -0,0 +1,113 @@
+# Load test for the Server-Sent Events push channel.
+# Starts the app on a local threaded server, connects a few hundred simulated agent and
+# customer subscribers to the /stream endpoints, sends agent messages through /chat and
+# reports end-to-end delivery latency (from the send request to arrival at each subscriber).
+#
+# Usage: python benchmarks/bench_push_fanout.py [subscribers] [messages]
+import argparse
+import http.client
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stub_backend  # noqa: F401  (must be imported before app)
+import app as vista_app
+from latency_stats import percentile
+from werkzeug.serving import WSGIRequestHandler, make_server
+
+HOST = '127.0.0.1'
+PORT = 5077
+CUSTOMER_ID = 'LOADTEST'
+SESSION_ID = 'loadtest-session'
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    def log_request(self, *args, **kwargs):
+        pass
+
+
+def subscriber(path, expected, arrivals, ready):
+    conn = http.client.HTTPConnection(HOST, PORT, timeout=60)
+    conn.request('GET', path)
+    response = conn.getresponse()
+    ready.release()
+    received = 0
+    while received < expected:
+        line = response.fp.readline()
+        if not line:
+            break
+        if line.startswith(b'data: '):
+            message = json.loads(line[len(b'data: '):])
+            arrivals.append((message['seq'], time.perf_counter()))
+            received += 1
+    conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Delivery latency of the Server-Sent Events push channel")
+    parser.add_argument('subscribers', type=int, nargs='?', default=300)
+    parser.add_argument('messages', type=int, nargs='?', default=20)
+    args = parser.parse_args()
+    subscriber_count, message_count = args.subscribers, args.messages
+
+    client = vista_app.app.test_client()
+    client.post('/initiate_agent_chat', json={
+        'session_id': SESSION_ID,
+        'customer_name': 'Load Test',
+        'customer_id': CUSTOMER_ID,
+        'chat_history': [{'sender': 'bot', 'text': 'Connecting you to an agent', 'time': '10:00'}]
+    })
+    start_seq = vista_app.agent_customer_chats[CUSTOMER_ID].last_seq
+
+    server = make_server(HOST, PORT, vista_app.app, threaded=True, request_handler=QuietRequestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    ready = threading.Semaphore(0)
+    arrivals = []
+    threads = []
+    for i in range(subscriber_count):
+        if i % 2 == 0:
+            path = f'/stream/agent?customer_id={CUSTOMER_ID}&after_seq={start_seq}'
+        else:
+            path = f'/stream/customer?session_id={SESSION_ID}&after_seq={start_seq}'
+        thread = threading.Thread(target=subscriber, args=(path, message_count, arrivals, ready), daemon=True)
+        thread.start()
+        threads.append(thread)
+    for _ in range(subscriber_count):
+        ready.acquire()
+    while vista_app.message_broker.subscriber_count() < subscriber_count:
+        time.sleep(0.01)
+
+    sent_at = {}
+    started = time.perf_counter()
+    for i in range(message_count):
+        sent_at[start_seq + i + 1] = time.perf_counter()
+        client.post('/chat', json={
+            'message': f'Agent reply {i}',
+            'session_id': 'agent-session',
+            'is_agent_chat': True,
+            'sender_type': 'agent',
+            'customer_id': CUSTOMER_ID
+        })
+        time.sleep(0.05)
+    for thread in threads:
+        thread.join(timeout=30)
+    elapsed = time.perf_counter() - started
+    server.shutdown()
+
+    latencies_ms = [(arrived - sent_at[seq]) * 1000 for seq, arrived in arrivals if seq in sent_at]
+    expected = subscriber_count * message_count
+    print(f"subscribers: {subscriber_count}  messages: {message_count}  deliveries: {len(latencies_ms)}/{expected}")
+    if latencies_ms:
+        print(f"latency ms  p50: {statistics.median(latencies_ms):.1f}  "
+              f"p99: {percentile(latencies_ms, 0.99):.1f}  max: {max(latencies_ms):.1f}")
+    print(f"wall time: {elapsed:.2f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,136 @@
+# Benchmark for the SQLite transaction store (transaction_store.py) behind
+# orchestrate_transaction.
+#
+# Seeds a synthetic dataset (about 2.4M rows with the defaults) on first run, then reports
+# per-query latency for:
+#   - a full table scan without the (customer_id, month) index, for reference
+#   - a new connection per query versus the connection pool
+#   - uncached summaries on random (customer_id, month) keys
+#   - follow-up questions (the same key several times in a row) through the result cache
+#   - concurrent request threads sharing the pool
+# and checks that a write to a (customer_id, month) invalidates its cached summary.
+#
+# Usage: python benchmarks/bench_transaction_store.py [--db PATH] [--customers 20000] [--months 12]
+import argparse
+import os
+import random
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from transaction_store import TransactionStore, connect, customer_ids, months_back, seed
+from latency_stats import percentile
+
+FOLLOW_UPS = 4 # Questions per (customer_id, month) in the follow-up scenario
+THREADS = 8
+
+
+def timed(fn, keys):
+    latencies = []
+    for key in keys:
+        start = time.perf_counter()
+        fn(*key)
+        latencies.append((time.perf_counter() - start) * 1000)
+    return latencies
+
+
+def report(label, latencies):
+    print(f"{label:<34} {statistics.median(latencies):>8.3f} {percentile(latencies, 0.95):>8.3f} "
+          f"{percentile(latencies, 0.99):>8.3f} {len(latencies):>7}")
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--db', default=os.path.join(tempfile.gettempdir(), 'vista_transactions_bench.db'))
+    parser.add_argument('--customers', type=int, default=20000)
+    parser.add_argument('--months', type=int, default=12)
+    parser.add_argument('--per-month', type=int, default=10)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        start = time.perf_counter()
+        count = seed(args.db, args.customers, args.months, args.per_month)
+        print(f"seeded {count} rows in {time.perf_counter() - start:.1f}s")
+    store = TransactionStore(args.db, pool_size=THREADS)
+    with store.pool.connection() as conn:
+        count = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    print(f"{args.db}: {count} transactions")
+
+    rng = random.Random(1)
+    all_customers = customer_ids(args.customers)
+    all_months = months_back(args.months)
+    keys = [(rng.choice(all_customers), rng.choice(all_months)) for _ in range(args.queries)]
+
+    print(f"{'scenario (ms)':<34} {'p50':>8} {'p95':>8} {'p99':>8} {'queries':>7}")
+
+    def full_scan(customer_id, month):
+        with store.pool.connection() as conn:
+            conn.execute(
+                "SELECT direction, SUM(amount) FROM transactions NOT INDEXED "
+                "WHERE customer_id = ? AND month = ? GROUP BY direction",
+                (customer_id, month)
+            ).fetchall()
+
+    report("no index (full scan)", timed(full_scan, keys[:3]))
+
+    def connection_per_query(customer_id, month):
+        conn = connect(args.db)
+        conn.execute(
+            "SELECT direction, category, COUNT(*), SUM(amount), MAX(amount) FROM transactions "
+            "WHERE customer_id = ? AND month = ? GROUP BY direction, category",
+            (customer_id, month)
+        ).fetchall()
+        conn.close()
+
+    report("index, new connection per query", timed(connection_per_query, keys[:500]))
+    report("index, pooled, uncached summary", timed(store._compute_summary, keys))
+
+    follow_ups = [key for key in keys[:args.queries // FOLLOW_UPS] for _ in range(FOLLOW_UPS)]
+    store.results.clear()
+    hits_before = store.results.hits
+    report(f"follow-ups ({FOLLOW_UPS}x same key), cached", timed(store.summary, follow_ups))
+    print(f"{'':<34} result cache hit rate {(store.results.hits - hits_before) / len(follow_ups):.0%}")
+
+    # Concurrent request threads sharing the pool
+    latencies = []
+    lock = threading.Lock()
+    chunks = [keys[i::THREADS] for i in range(THREADS)]
+
+    def worker(chunk):
+        local = timed(store._compute_summary, chunk)
+        with lock:
+            latencies.extend(local)
+
+    workers = [threading.Thread(target=worker, args=(chunk,)) for chunk in chunks]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    report(f"{THREADS} threads, pooled, uncached", latencies)
+    print(f"{'':<34} {len(latencies) / elapsed:.0f} summaries/s, {store.pool.created} pooled connections")
+
+    # A new transaction for a cached key must show up in the next summary
+    customer_id, month = keys[0]
+    before = store.summary(customer_id, month)
+    start = time.perf_counter()
+    store.add_transactions([(customer_id, f"{month}-15", 123.45, 'debit', 'dining', 'benchmark write')])
+    write_ms = (time.perf_counter() - start) * 1000
+    after = store.summary(customer_id, month)
+    assert after['count'] == before['count'] + 1, "cached summary was not invalidated by the write"
+    print(f"write + invalidation: insert {write_ms:.2f} ms, summary count {before['count']} -> {after['count']}")
+    with store.pool.connection() as conn:
+        conn.execute("DELETE FROM transactions WHERE description = 'benchmark write'")
+        conn.commit()
+    print(f"store stats: {store.stats()}")
+    store.close()
+
+
+if __name__ == '__main__':
+    main()
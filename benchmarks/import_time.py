@@ -0,0 +1,80 @@
+# Import-time regression benchmark for app.py (python -X importtime report).
+# Importing app must not pull in torch / transformers / sentence-transformers (models are
+# loaded lazily by model_registry.py) and must stay within the budget recorded in
+# import_time_baseline.json. Exits with status 1 on a regression.
+#
+# Usage: python benchmarks/import_time.py [--top N] [--update]
+#   --update  re-record the baseline budget from this machine's measurement
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'import_time_baseline.json')
+BUDGET_HEADROOM = 1.5 # Budget recorded by --update, relative to the measured import time
+RUNS = 5
+
+
+def measure():
+    # One `import app` in a fresh interpreter; returns [(self_us, cumulative_us, depth, module)]
+    env = dict(os.environ, VISTA_MODEL_WARMUP='lazy')
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import app'],
+        cwd=ROOT, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        sys.exit(f"import app failed:\n{result.stderr}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        depth = (len(name) - len(name.lstrip())) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Import-time profile of app.py")
+    parser.add_argument('--top', type=int, default=15, help="Number of slowest imports to show")
+    parser.add_argument('--update', action='store_true', help="Re-record the baseline budget")
+    args = parser.parse_args()
+
+    with open(BASELINE_PATH, encoding='utf-8') as f:
+        baseline = json.load(f)
+
+    # Median of several runs, the first one also pays for cold .pyc / disk caches
+    runs = [measure() for _ in range(RUNS)]
+    totals_ms = sorted(sum(row[1] for row in rows if row[2] == 0) / 1000 for rows in runs)
+    total_ms = totals_ms[len(totals_ms) // 2]
+    rows = runs[-1]
+
+    print(f"{'cumulative ms':>14} {'self ms':>9}  module")
+    for self_us, cumulative_us, depth, name in sorted(rows, key=lambda row: -row[1])[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f} {self_us / 1000:>9.1f}  {'  ' * depth}{name}")
+    print(f"\ntotal import time (median of {RUNS}): {total_ms:.1f} ms, budget: {baseline['max_total_ms']} ms")
+
+    if args.update:
+        baseline['max_total_ms'] = round(total_ms * BUDGET_HEADROOM)
+        with open(BASELINE_PATH, 'w', encoding='utf-8') as f:
+            json.dump(baseline, f, indent=2)
+            f.write('\n')
+        print(f"Updated baseline budget to {baseline['max_total_ms']} ms")
+        return
+
+    failures = []
+    imported = {row[3] for row in rows}
+    for module in baseline['forbidden_modules']:
+        if module in imported:
+            failures.append(f"'{module}' is imported by app.py at import time")
+    if total_ms > baseline['max_total_ms']:
+        failures.append(f"import time {total_ms:.1f} ms is over the {baseline['max_total_ms']} ms budget")
+    for failure in failures:
+        print(f"REGRESSION: {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == '__main__':
+    main()
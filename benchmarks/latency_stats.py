@@ -0,0 +1,7 @@
+# Shared helpers for the benchmark scripts' latency reports
+def percentile(values, fraction):
+    # Nearest-rank percentile of unsorted values, e.g. fraction 0.99 for p99; 0.0 when empty
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
@@ -0,0 +1,224 @@
+# Multi-worker stress test for the state backends (state_backend.py).
+# Several workers send customer and agent messages for the same handful of customers
+# through app.py's /chat endpoint while agents concurrently fetch (and mark as read) the
+# same chats through /get_agent_messages. Afterwards it checks, for every customer, that
+#   - no message was lost or duplicated (sequence numbers are exactly 1..n)
+#   - the unread counter equals the number of customer messages still unread
+#   - a final fetch by the agent brings the counter back to 0
+#
+#   sqlite  every worker is a separate process (like Gunicorn workers) sharing VISTA_STATE_DB
+#   memory  every worker is a thread in one process (the single-worker deployment)
+#
+# The backend models are replaced by stub_backend.py.
+#
+# Usage: python benchmarks/stress_shared_state.py [--backend sqlite|memory|both] [--workers 4] [--messages 200]
+import argparse
+import contextlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+CUSTOMERS = [f"STRESS{i:03d}" for i in range(8)]
+
+
+def session_id(customer_id):
+    return f"session-{customer_id}"
+
+
+def import_app():
+    sys.path.insert(0, os.path.dirname(BENCH_DIR))
+    sys.path.insert(0, BENCH_DIR)
+    import stub_backend  # noqa: F401
+    import app
+    return app
+
+
+def setup(app):
+    client = app.app.test_client()
+    for customer_id in CUSTOMERS:
+        response = client.post('/initiate_agent_chat', json={
+            'session_id': session_id(customer_id),
+            'customer_name': f"Customer {customer_id}",
+            'customer_id': customer_id,
+            'chat_history': [
+                {'sender': 'user', 'text': "What is my account balance?", 'time': '10:00'},
+                {'sender': 'bot', 'text': "Please hold, connecting you to an agent.", 'time': '10:00'}
+            ]
+        })
+        assert response.status_code == 200, response.get_json()
+
+
+def run_worker(app, worker_id, messages):
+    # Sends `messages` messages and fetches chats until done; returns the number of
+    # messages sent per customer
+    client = app.app.test_client()
+    rng = random.Random(worker_id)
+    sent = {customer_id: 0 for customer_id in CUSTOMERS}
+    done = threading.Event()
+    errors = []
+
+    def send():
+        try:
+            for i in range(messages):
+                customer_id = rng.choice(CUSTOMERS)
+                if i % 2 == 0:
+                    payload = {'message': f"customer message {worker_id}-{i}", 'session_id': session_id(customer_id),
+                               'is_agent_chat': True, 'sender_type': 'customer'}
+                else:
+                    payload = {'message': f"agent reply {worker_id}-{i}", 'session_id': f"agent-{worker_id}",
+                               'is_agent_chat': True, 'sender_type': 'agent', 'customer_id': customer_id}
+                response = client.post('/chat', json=payload)
+                if response.status_code != 200:
+                    errors.append(response.get_json())
+                sent[customer_id] += 1
+        finally:
+            done.set()
+
+    def fetch():
+        fetch_client = app.app.test_client()
+        fetch_rng = random.Random(1000 + worker_id)
+        cursors = {customer_id: 0 for customer_id in CUSTOMERS}
+        while not done.is_set():
+            customer_id = fetch_rng.choice(CUSTOMERS)
+            # Now and then re-read the whole chat, so workers mark the same messages concurrently
+            after_seq = 0 if fetch_rng.random() < 0.2 else cursors[customer_id]
+            response = fetch_client.post('/get_agent_messages', json={'customer_id': customer_id, 'after_seq': after_seq})
+            cursors[customer_id] = response.get_json()['last_seq']
+
+    threads = [threading.Thread(target=send), threading.Thread(target=fetch)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert not errors, errors[:3]
+    return sent
+
+
+def verify(app, sent_per_customer):
+    problems = []
+    history = 2 # Messages added by setup()
+    client = app.app.test_client()
+    for customer_id in CUSTOMERS:
+        chat = app.agent_customer_chats.get(customer_id)
+        messages = chat.messages_after(0)
+        seqs = [msg['seq'] for msg in messages]
+        expected = history + sent_per_customer.get(customer_id, 0)
+        if seqs != list(range(1, expected + 1)):
+            problems.append(f"{customer_id}: {len(seqs)} messages (last seq {chat.last_seq}), expected {expected}")
+        unread = sum(1 for msg in messages if msg['sender'] == 'user' and not msg['read_by_agent'])
+        if chat.unread_by_agent != unread:
+            problems.append(f"{customer_id}: unread counter {chat.unread_by_agent}, {unread} messages unread")
+        client.post('/get_agent_messages', json={'customer_id': customer_id})
+        if chat.unread_by_agent != 0:
+            problems.append(f"{customer_id}: unread counter {chat.unread_by_agent} after the agent read everything")
+    return problems
+
+
+def child(role, worker_id, workers, messages, sent_json):
+    # Runs in a child process with the backend selected through the environment.
+    # The app's request logging is discarded; the result is the last line of output.
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        app = import_app()
+        if role == 'setup':
+            setup(app)
+            result = {}
+        elif role == 'worker':
+            result = run_worker(app, worker_id, messages)
+        elif role == 'verify':
+            result = {'problems': verify(app, json.loads(sent_json))}
+        else: # 'threads': everything in this process, one thread per worker
+            setup(app)
+            results = [None] * workers
+            threads = [
+                threading.Thread(target=lambda i=i: results.__setitem__(i, run_worker(app, i, messages)))
+                for i in range(workers)
+            ]
+            start = time.perf_counter()
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            elapsed = time.perf_counter() - start
+            sent = {customer_id: sum(r[customer_id] for r in results) for customer_id in CUSTOMERS}
+            result = {'sent': sent, 'seconds': elapsed, 'problems': verify(app, sent)}
+    print(json.dumps(result))
+
+
+def run_child(env, *args):
+    completed = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), *args],
+        env=env, check=True, capture_output=True, text=True
+    )
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+
+def stress(backend, workers, messages):
+    env = dict(os.environ, VISTA_STATE_BACKEND=backend, VISTA_MODEL_WARMUP='lazy')
+    common = ['--workers', str(workers), '--messages', str(messages)]
+    if backend == 'memory':
+        result = run_child(env, '--role', 'threads', *common)
+        return result['sent'], result['seconds'], result['problems']
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env['VISTA_STATE_DB'] = os.path.join(tmp, 'state.db')
+        run_child(env, '--role', 'setup', *common)
+        start = time.perf_counter()
+        processes = [
+            subprocess.Popen(
+                [sys.executable, os.path.abspath(__file__), '--role', 'worker', '--worker-id', str(i), *common],
+                env=env, stdout=subprocess.PIPE, text=True
+            )
+            for i in range(workers)
+        ]
+        sent = {customer_id: 0 for customer_id in CUSTOMERS}
+        for process in processes:
+            stdout, _ = process.communicate()
+            if process.returncode != 0:
+                raise RuntimeError(f"worker exited with {process.returncode}")
+            for customer_id, count in json.loads(stdout.strip().splitlines()[-1]).items():
+                sent[customer_id] += count
+        elapsed = time.perf_counter() - start
+        problems = run_child(env, '--role', 'verify', '--sent', json.dumps(sent), *common)['problems']
+    return sent, elapsed, problems
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--backend', choices=['sqlite', 'memory', 'both'], default='both')
+    parser.add_argument('--workers', type=int, default=4)
+    parser.add_argument('--messages', type=int, default=200, help="messages sent per worker")
+    parser.add_argument('--role', help=argparse.SUPPRESS)
+    parser.add_argument('--worker-id', type=int, default=0, help=argparse.SUPPRESS)
+    parser.add_argument('--sent', default='{}', help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.role:
+        child(args.role, args.worker_id, args.workers, args.messages, args.sent)
+        return
+
+    failed = False
+    backends = ['memory', 'sqlite'] if args.backend == 'both' else [args.backend]
+    for backend in backends:
+        sent, elapsed, problems = stress(backend, args.workers, args.messages)
+        total = sum(sent.values())
+        kind = 'threads' if backend == 'memory' else 'processes'
+        print(f"{backend}: {args.workers} worker {kind}, {total} messages in {elapsed:.1f}s "
+              f"({total / elapsed:.0f} msg/s with concurrent agent fetches)")
+        for problem in problems:
+            print(f"  FAIL {problem}")
+        if not problems:
+            print("  OK: no lost or duplicated messages, unread counters consistent")
+        failed = failed or bool(problems)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,331 @@
+# Storage for agent-customer chat messages.
+# Each customer's chat keeps a monotonically increasing message sequence number and a
+# running count of customer messages the agent hasn't read yet. Polling endpoints can
+# then fetch only messages after a known sequence number, and the agent dashboard can
+# read unread counts without walking the whole conversation.
+#
+# Memory is bounded when the store has a ChatArchive: each chat keeps only its most recent
+# messages in memory and moves older ones, in batches, to an append-only SQLite file, from
+# where they are loaded again only when someone scrolls back. Chats without activity for
+# idle_ttl_seconds are archived completely and dropped from memory; they are restored from
+# the archive the next time they are used.
+import atexit
+import os
+import sqlite3
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+
+MESSAGE_FIELDS = ('sender', 'original_text', 'translated_text', 'lang', 'timestamp', 'read_by_agent', 'seq')
+
+
+class ChatMessage:
+    # Compact message record. Supports msg['field'] / msg.get('field') like the message dicts
+    # it replaces, so the endpoints and views read it unchanged.
+    __slots__ = MESSAGE_FIELDS
+
+    def __init__(self, sender, original_text, translated_text, lang, timestamp, read_by_agent=False, seq=0):
+        self.sender = sys.intern(sender)
+        self.original_text = original_text
+        # Bot and English messages store the same string once
+        self.translated_text = original_text if translated_text == original_text else translated_text
+        self.lang = sys.intern(lang) if lang else lang
+        self.timestamp = timestamp
+        self.read_by_agent = read_by_agent
+        self.seq = seq
+
+    @classmethod
+    def from_dict(cls, message):
+        return cls(
+            message['sender'], message['original_text'], message['translated_text'], message.get('lang', 'en'),
+            message['timestamp'], message.get('read_by_agent', False), message.get('seq', 0)
+        )
+
+    def __getitem__(self, field):
+        try:
+            return getattr(self, field)
+        except (AttributeError, TypeError):
+            raise KeyError(field) from None
+
+    def __setitem__(self, field, value):
+        if field not in MESSAGE_FIELDS:
+            raise KeyError(field)
+        setattr(self, field, value)
+
+    def get(self, field, default=None):
+        return getattr(self, field, default) if field in MESSAGE_FIELDS else default
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in MESSAGE_FIELDS}
+
+
+class ChatArchive:
+    # Append-only SQLite log of archived chat messages. Messages are never updated: when the
+    # agent reads an archived message, a row is added to chat_reads instead.
+    # Without db_path, a temporary file is used and removed when the process exits.
+    def __init__(self, db_path=None):
+        self.temporary = db_path is None
+        if self.temporary:
+            fd, db_path = tempfile.mkstemp(prefix='vista-chat-archive-', suffix='.db')
+            os.close(fd)
+            atexit.register(self.close)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        # One shared connection, only used while holding self._lock
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chat_messages ("
+            "customer_id TEXT NOT NULL, seq INTEGER NOT NULL, sender TEXT NOT NULL, "
+            "original_text TEXT NOT NULL, translated_text TEXT, lang TEXT, timestamp TEXT, "
+            "read_by_agent INTEGER NOT NULL, PRIMARY KEY (customer_id, seq)) WITHOUT ROWID"
+        )
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS chat_reads ("
+            "customer_id TEXT NOT NULL, seq INTEGER NOT NULL, PRIMARY KEY (customer_id, seq)) WITHOUT ROWID"
+        )
+        self._db.commit()
+
+    def append(self, customer_id, messages):
+        rows = [
+            (customer_id, msg.seq, msg.sender, msg.original_text,
+             None if msg.translated_text is msg.original_text else msg.translated_text,
+             msg.lang, msg.timestamp, int(msg.read_by_agent))
+            for msg in messages
+        ]
+        with self._lock:
+            # OR IGNORE: a restored chat may archive a message that is already on disk
+            self._db.executemany("INSERT OR IGNORE INTO chat_messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+            self._db.commit()
+
+    def mark_read(self, customer_id, seqs):
+        # Returns how many of the messages were not marked as read before
+        with self._lock:
+            cursor = self._db.executemany(
+                "INSERT OR IGNORE INTO chat_reads (customer_id, seq) VALUES (?, ?)",
+                [(customer_id, seq) for seq in seqs]
+            )
+            self._db.commit()
+        return cursor.rowcount
+
+    def load(self, customer_id, after_seq=0, before_seq=None, limit=None):
+        # Archived messages with after_seq < seq < before_seq in seq order; with a limit,
+        # the newest `limit` of them (one page of scroll-back)
+        with self._lock:
+            rows = self._db.execute(
+                "SELECT m.sender, m.original_text, COALESCE(m.translated_text, m.original_text), m.lang, m.timestamp, "
+                "m.read_by_agent OR r.seq IS NOT NULL, m.seq "
+                "FROM chat_messages m LEFT JOIN chat_reads r ON r.customer_id = m.customer_id AND r.seq = m.seq "
+                "WHERE m.customer_id = ? AND m.seq > ? AND m.seq < ? ORDER BY m.seq DESC LIMIT ?",
+                (customer_id, after_seq, sys.maxsize if before_seq is None else before_seq, -1 if limit is None else limit)
+            ).fetchall()
+        return [ChatMessage(*row[:5], read_by_agent=bool(row[5]), seq=row[6]) for row in reversed(rows)]
+
+    def last_seq(self, customer_id):
+        with self._lock:
+            row = self._db.execute("SELECT MAX(seq) FROM chat_messages WHERE customer_id = ?", (customer_id,)).fetchone()
+        return row[0] or 0
+
+    def unread_count(self, customer_id):
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COUNT(*) FROM chat_messages m "
+                "LEFT JOIN chat_reads r ON r.customer_id = m.customer_id AND r.seq = m.seq "
+                "WHERE m.customer_id = ? AND m.sender = 'user' AND NOT m.read_by_agent AND r.seq IS NULL",
+                (customer_id,)
+            ).fetchone()
+        return row[0]
+
+    def close(self):
+        with self._lock:
+            if self._db is None:
+                return
+            self._db.close()
+            self._db = None
+        if self.temporary:
+            for suffix in ('', '-wal', '-shm'):
+                try:
+                    os.remove(self.db_path + suffix)
+                except OSError:
+                    pass
+
+
+class ChatLog:
+    __slots__ = ('customer_id', 'messages', 'last_seq', 'unread_by_agent', 'archived_through',
+                 '_archive', '_max_in_memory', '_lock')
+
+    def __init__(self, customer_id=None, archive=None, max_in_memory=None):
+        self.customer_id = customer_id
+        self.messages = [] # Most recent messages, contiguous seq, ending at last_seq
+        self.last_seq = 0 # Sequence number of the newest message, 0 when empty
+        self.unread_by_agent = 0 # Customer ('user') messages not yet read by the agent
+        self.archived_through = 0 # Messages with seq <= this are in the archive
+        self._archive = archive
+        self._max_in_memory = max_in_memory
+        self._lock = threading.Lock()
+        if archive is not None:
+            # Continue a chat that was evicted earlier (or archived by a previous run)
+            self.last_seq = self.archived_through = archive.last_seq(customer_id)
+            if self.last_seq:
+                self.unread_by_agent = archive.unread_count(customer_id)
+                self.messages = archive.load(customer_id, limit=1) # For last_message()
+
+    def __len__(self):
+        return self.last_seq # Sequence numbers start at 1 and are contiguous
+
+    def __iter__(self):
+        return iter(self.messages_after(0))
+
+    def append(self, message):
+        # Stores the message (a dict or ChatMessage), assigns its sequence number and
+        # returns the stored record
+        if not isinstance(message, ChatMessage):
+            message = ChatMessage.from_dict(message)
+        with self._lock:
+            self.last_seq += 1
+            message.seq = self.last_seq
+            if message.sender == 'user' and not message.read_by_agent:
+                self.unread_by_agent += 1
+            self.messages.append(message)
+            # Archive in batches of half the in-memory limit so not every append writes to disk
+            if self._max_in_memory is not None and len(self.messages) >= self._max_in_memory * 3 // 2 + 1:
+                self._archive_oldest(len(self.messages) - self._max_in_memory)
+        return message
+
+    def archive_all(self):
+        # Writes every message not yet archived (before the chat is evicted from memory)
+        with self._lock:
+            if self._archive is not None:
+                self._archive_oldest(len(self.messages))
+
+    def _archive_oldest(self, count):
+        # Called with self._lock held. Readers keep working on the old list object.
+        pending = [msg for msg in self.messages[:count] if msg.seq > self.archived_through]
+        if pending:
+            self._archive.append(self.customer_id, pending)
+            self.archived_through = pending[-1].seq
+        self.messages = self.messages[count:]
+
+    def last_message(self):
+        messages = self.messages
+        return messages[-1] if messages else None
+
+    def messages_after(self, after_seq=0):
+        # Messages with seq > after_seq. Sequence numbers are contiguous, so the in-memory
+        # part is a slice; anything older is loaded from the archive.
+        messages = self.messages
+        first_seq = messages[0].seq if messages else self.last_seq + 1
+        if after_seq + 1 >= first_seq:
+            return messages[after_seq - first_seq + 1:]
+        if self._archive is None or after_seq >= self.archived_through:
+            return messages
+        return self._archive.load(self.customer_id, after_seq=after_seq, before_seq=first_seq) + messages
+
+    def messages_before(self, before_seq, limit=50):
+        # Scroll-back: up to `limit` messages with seq < before_seq, oldest first
+        messages = self.messages
+        if messages:
+            first_seq, before_seq = messages[0].seq, min(before_seq, messages[-1].seq + 1)
+        else:
+            first_seq = before_seq = min(before_seq, self.last_seq + 1)
+        page = messages[max(before_seq - first_seq - limit, 0):max(before_seq - first_seq, 0)]
+        missing = limit - len(page)
+        if missing > 0 and self._archive is not None:
+            page = self._archive.load(self.customer_id, before_seq=min(before_seq, first_seq), limit=missing) + page
+        return page
+
+    def mark_read_by_agent(self, messages):
+        # In-memory messages are shared objects, so their flag tells whether another fetch already
+        # counted them. Archived messages are loaded as fresh copies each time; for those only the
+        # reads that chat_reads didn't have yet are counted. Both under the chat's lock.
+        with self._lock:
+            archived_seqs = []
+            for msg in messages:
+                if msg['sender'] != 'user' or msg.get('read_by_agent', False):
+                    continue
+                msg['read_by_agent'] = True
+                if msg['seq'] <= self.archived_through and self._archive is not None:
+                    archived_seqs.append(msg['seq'])
+                else:
+                    self.unread_by_agent -= 1
+            if archived_seqs:
+                self.unread_by_agent -= self._archive.mark_read(self.customer_id, archived_seqs)
+
+
+class ChatStore:
+    def __init__(self, archive=None, max_in_memory=None, idle_ttl_seconds=None, clock=time.monotonic):
+        # Without an archive every message stays in memory and nothing is evicted
+        self.archive = archive
+        self.max_in_memory = max_in_memory if archive is not None else None
+        self.idle_ttl_seconds = idle_ttl_seconds if archive is not None else None
+        self.evicted = 0
+        self._clock = clock
+        self._chats = {} # Key: customer_id, Value: ChatLog
+        self._last_used = OrderedDict() # Key: customer_id, least recently used first
+        self._lock = threading.Lock()
+
+    def __contains__(self, customer_id):
+        return customer_id in self._chats
+
+    def __getitem__(self, customer_id):
+        chat = self.get(customer_id)
+        if chat is None:
+            raise KeyError(customer_id)
+        return chat
+
+    def __len__(self):
+        return len(self._chats)
+
+    def get(self, customer_id, default=None):
+        chat = self._chats.get(customer_id)
+        if chat is None:
+            return default
+        self._touch(customer_id)
+        return chat
+
+    def get_or_create(self, customer_id):
+        chat = self._chats.get(customer_id)
+        if chat is None:
+            with self._lock:
+                chat = self._chats.get(customer_id)
+                if chat is None:
+                    chat = self._chats[customer_id] = ChatLog(customer_id, self.archive, self.max_in_memory)
+        self._touch(customer_id)
+        return chat
+
+    def items(self):
+        # Snapshot, so eviction during iteration is safe
+        return list(self._chats.items())
+
+    def _touch(self, customer_id):
+        if self.idle_ttl_seconds is None:
+            return
+        now = self._clock()
+        with self._lock:
+            self._last_used[customer_id] = now
+            self._last_used.move_to_end(customer_id)
+        self.evict_idle(now)
+
+    def evict_idle(self, now=None):
+        # Archives and drops chats unused for idle_ttl_seconds; returns how many were evicted
+        if self.idle_ttl_seconds is None:
+            return 0
+        now = self._clock() if now is None else now
+        evicted = []
+        with self._lock:
+            while self._last_used:
+                customer_id, last_used = next(iter(self._last_used.items()))
+                if now - last_used < self.idle_ttl_seconds:
+                    break
+                del self._last_used[customer_id]
+                chat = self._chats.pop(customer_id, None)
+                if chat is not None:
+                    # Archived before the lock is released, so get_or_create can't restore
+                    # the chat from an incomplete archive
+                    chat.archive_all()
+                    evicted.append(chat)
+            self.evicted += len(evicted)
+        return len(evicted)
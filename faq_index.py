@@ -0,0 +1,229 @@
+# Precomputed, memory-mapped embedding index for FAQ / knowledge-base answers.
+#
+# FAQ question embeddings are computed offline with the sentence transformer and saved
+# as a normalized float32 (or int8-quantized) .npy matrix. Workers open the matrix with
+# mmap, so startup time and RSS don't grow with the corpus and several Gunicorn workers
+# on one machine share the same page-cached file. A lookup is a single matrix-vector
+# product followed by an argpartition top-k.
+#
+# Index directory layout (every build gets a new version, the manifest is replaced last
+# so running workers keep reading the files of the version they loaded):
+#   manifest.json               {"format", "version", "model", "dtype", "dim", "count"}
+#   entries-<version>.json      [{"key", "question", "answer"}, ...] in matrix row order
+#   embeddings-<version>.npy    (count, dim) float32 or int8
+#   scales-<version>.npy        (count,) float32 per-row scales, int8 indexes only
+#
+# Search is exact by default. For large knowledge bases an approximate engine from
+# search_engines.py ('ivf' or 'hnsw') can be selected; its trained structure is cached
+# in the index directory as <engine>-<version>-<params>.
+#
+# Rebuild CLI (only questions that changed since the previous build are re-embedded):
+#   python faq_index.py build faqs.csv faq_index/ [--int8] [--model all-MiniLM-L6-v2]
+#   python faq_index.py search faq_index/ "how do I reset my PIN" [--engine ivf]
+import argparse
+import csv
+import hashlib
+import json
+import os
+import threading
+
+import numpy as np
+
+from search_engines import build_engine
+
+FORMAT_VERSION = 1
+DEFAULT_MODEL = 'all-MiniLM-L6-v2'
+
+_encoders = {}
+_encoders_lock = threading.Lock()
+
+
+def get_encoder(model_name=DEFAULT_MODEL):
+    # Sentence transformer, loaded once per process on first use
+    with _encoders_lock:
+        if model_name not in _encoders:
+            from sentence_transformers import SentenceTransformer
+            _encoders[model_name] = SentenceTransformer(model_name)
+        return _encoders[model_name]
+
+
+def encode_texts(texts, model_name=DEFAULT_MODEL, encoder=None):
+    # Normalized float32 embeddings, shape (len(texts), dim)
+    encoder = encoder or get_encoder(model_name)
+    embeddings = encoder.encode(list(texts), convert_to_numpy=True, normalize_embeddings=True)
+    return np.asarray(embeddings, dtype=np.float32)
+
+
+def entry_key(question):
+    return hashlib.sha1(question.strip().encode('utf-8')).hexdigest()
+
+
+def load_faq_file(path):
+    # FAQ corpus as a list of {'question', 'answer'} from a CSV (question,answer columns) or JSON list
+    if path.endswith('.json'):
+        with open(path, encoding='utf-8') as f:
+            rows = json.load(f)
+    else:
+        with open(path, encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+    return [{'question': row['question'], 'answer': row['answer']} for row in rows if row.get('question')]
+
+
+def quantize_int8(embeddings):
+    scales = np.abs(embeddings).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    quantized = np.round(embeddings / scales[:, None]).astype(np.int8)
+    return quantized, scales.astype(np.float32)
+
+
+class FaqIndex:
+    def __init__(self, index_dir, manifest, entries, embeddings, scales=None, engine='exact', **engine_params):
+        self.index_dir = index_dir
+        self.manifest = manifest
+        self.version = manifest['version']
+        self.model_name = manifest['model']
+        self.entries = entries
+        self.embeddings = embeddings
+        self.scales = scales
+        self.engine = build_engine(
+            engine, embeddings, scales,
+            cache_path=os.path.join(index_dir, f'{engine}-{self.version}'),
+            **engine_params
+        )
+
+    @classmethod
+    def load(cls, index_dir, engine='exact', **engine_params):
+        with open(os.path.join(index_dir, 'manifest.json'), encoding='utf-8') as f:
+            manifest = json.load(f)
+        if manifest.get('format') != FORMAT_VERSION:
+            raise ValueError(f"Unsupported FAQ index format: {manifest.get('format')}")
+        version = manifest['version']
+        with open(os.path.join(index_dir, f'entries-{version}.json'), encoding='utf-8') as f:
+            entries = json.load(f)
+        embeddings = np.load(os.path.join(index_dir, f'embeddings-{version}.npy'), mmap_mode='r')
+        scales = None
+        if manifest['dtype'] == 'int8':
+            scales = np.load(os.path.join(index_dir, f'scales-{version}.npy'))
+        return cls(index_dir, manifest, entries, embeddings, scales, engine, **engine_params)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def current_version(self):
+        # Version named by the manifest on disk, which changes after a rebuild
+        with open(os.path.join(self.index_dir, 'manifest.json'), encoding='utf-8') as f:
+            return json.load(f)['version']
+
+    def search(self, query_embedding, k=1):
+        # Top-k (entry index, cosine similarity) pairs of a normalized query embedding, best first
+        return self.engine.search(query_embedding, k)
+
+    def dequantized(self):
+        # Float32 copy of the embedding matrix (used when rebuilding)
+        embeddings = np.asarray(self.embeddings, dtype=np.float32)
+        if self.scales is not None:
+            embeddings = embeddings * self.scales[:, None]
+        return embeddings
+
+
+def build_index(faq_path, index_dir, model_name=DEFAULT_MODEL, dtype='float32', encode=None):
+    # Build (or incrementally rebuild) the index for a FAQ file; returns (new version, re-embedded count)
+    encode = encode or (lambda texts: encode_texts(texts, model_name))
+    faqs = load_faq_file(faq_path)
+    os.makedirs(index_dir, exist_ok=True)
+
+    previous = None
+    if os.path.exists(os.path.join(index_dir, 'manifest.json')):
+        previous = FaqIndex.load(index_dir)
+        if previous.model_name != model_name:
+            previous = None # Embeddings from another model can't be reused
+
+    reusable = {}
+    if previous is not None:
+        previous_embeddings = previous.dequantized()
+        for row, entry in enumerate(previous.entries):
+            reusable[entry['key']] = previous_embeddings[row]
+
+    entries = []
+    to_encode = []
+    for faq in faqs:
+        key = entry_key(faq['question'])
+        entries.append({'key': key, 'question': faq['question'], 'answer': faq['answer']})
+        if key not in reusable:
+            to_encode.append(faq['question'])
+
+    encoded = dict(zip(to_encode, encode(to_encode))) if to_encode else {}
+    dim = len(next(iter(encoded.values()))) if encoded else (len(next(iter(reusable.values()))) if reusable else 0)
+    embeddings = np.zeros((len(entries), dim), dtype=np.float32)
+    for row, entry in enumerate(entries):
+        vector = reusable.get(entry['key'])
+        embeddings[row] = vector if vector is not None else encoded[entry['question']]
+
+    digest = hashlib.sha1(f"{model_name}:{dtype}".encode('utf-8'))
+    for entry in entries:
+        digest.update(entry['key'].encode('utf-8'))
+        digest.update(entry['answer'].encode('utf-8'))
+    version = digest.hexdigest()[:16]
+    if previous is not None and previous.version == version:
+        return version, 0 # Nothing changed, don't rewrite files workers have mapped
+
+    if dtype == 'int8':
+        quantized, scales = quantize_int8(embeddings)
+        np.save(os.path.join(index_dir, f'embeddings-{version}.npy'), quantized)
+        np.save(os.path.join(index_dir, f'scales-{version}.npy'), scales)
+    else:
+        np.save(os.path.join(index_dir, f'embeddings-{version}.npy'), embeddings)
+    with open(os.path.join(index_dir, f'entries-{version}.json'), 'w', encoding='utf-8') as f:
+        json.dump(entries, f, ensure_ascii=False)
+
+    manifest = {
+        'format': FORMAT_VERSION,
+        'version': version,
+        'model': model_name,
+        'dtype': dtype,
+        'dim': dim,
+        'count': len(entries)
+    }
+    manifest_tmp = os.path.join(index_dir, 'manifest.json.tmp')
+    with open(manifest_tmp, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(manifest_tmp, os.path.join(index_dir, 'manifest.json'))
+
+    # Keep the new and the previous version on disk, older workers may still have it mapped
+    keep = {version, previous.version if previous is not None else version}
+    for name in os.listdir(index_dir):
+        prefix, _, rest = name.partition('-')
+        file_version = rest.split('-')[0].split('.')[0]
+        if prefix in ('entries', 'embeddings', 'scales', 'ivf', 'hnsw') and file_version not in keep:
+            os.remove(os.path.join(index_dir, name))
+    return version, len(to_encode)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the precomputed FAQ embedding index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    build_parser = subparsers.add_parser('build', help="(Re)build the index, re-embedding only changed questions")
+    build_parser.add_argument('faq_file', help="CSV with question,answer columns or JSON list of objects")
+    build_parser.add_argument('index_dir')
+    build_parser.add_argument('--model', default=DEFAULT_MODEL)
+    build_parser.add_argument('--int8', action='store_true', help="Store int8-quantized embeddings")
+    search_parser = subparsers.add_parser('search', help="Query the index")
+    search_parser.add_argument('index_dir')
+    search_parser.add_argument('query')
+    search_parser.add_argument('-k', type=int, default=3)
+    search_parser.add_argument('--engine', default='exact', help="exact, ivf or hnsw")
+    search_parser.add_argument('--params', default='{}', help="Engine parameters as JSON, e.g. '{\"n_probe\": 16}'")
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        version, encoded = build_index(args.faq_file, args.index_dir, args.model, 'int8' if args.int8 else 'float32')
+        print(f"Built FAQ index version {version} ({encoded} entries re-embedded)")
+    else:
+        index = FaqIndex.load(args.index_dir, args.engine, **json.loads(args.params))
+        query_embedding = encode_texts([args.query], index.model_name)[0]
+        for row, score in index.search(query_embedding, args.k):
+            print(f"{score:.3f}  {index.entries[row]['question']} -> {index.entries[row]['answer']}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+# Dynamic micro-batching for model inference.
+# Flask request threads submit single items (a query to encode, a message to classify) and
+# get a Future back. One worker thread per scheduler collects concurrent submissions and
+# runs them through the model as one batch, as soon as max_batch_size items are queued or
+# the oldest item has waited max_wait_ms. That replaces many small forward passes competing
+# for torch with a few larger ones, while bounding the extra latency per request.
+# Under light load there is nothing to batch with, so the wait is skipped: an item that is
+# alone in the queue, after a batch that was alone as well, runs right away.
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class BatchScheduler:
+    def __init__(self, batch_fn, max_batch_size=32, max_wait_ms=8, name='batch'):
+        # batch_fn(items) -> list of results, one per item, in the same order
+        self.batch_fn = batch_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.name = name
+        self._queue = deque() # (item, future, submitted_at)
+        self._condition = threading.Condition()
+        self._worker = None
+        self._last_batch_size = 0
+        # Metrics
+        self.submitted = 0
+        self.batches = 0
+        self.batched_items = 0
+        self.max_queue_depth = 0
+        self.total_wait_seconds = 0.0
+        self.batch_sizes = {} # Key: batch size, Value: number of batches of that size
+
+    def submit(self, item):
+        future = Future()
+        with self._condition:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._run, name=f'{self.name}-scheduler', daemon=True)
+                self._worker.start()
+            self._queue.append((item, future, time.perf_counter()))
+            self.submitted += 1
+            self.max_queue_depth = max(self.max_queue_depth, len(self._queue))
+            self._condition.notify()
+        return future
+
+    def __call__(self, item, timeout=None):
+        # Blocking call for request threads
+        return self.submit(item).result(timeout)
+
+    def queue_depth(self):
+        with self._condition:
+            return len(self._queue)
+
+    def _next_batch(self):
+        with self._condition:
+            while not self._queue:
+                self._condition.wait()
+            busy = len(self._queue) > 1 or self._last_batch_size > 1
+            deadline = self._queue[0][2] + (self.max_wait if busy else 0.0)
+            while len(self._queue) < self.max_batch_size:
+                remaining = deadline - time.perf_counter()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            count = min(len(self._queue), self.max_batch_size)
+            self._last_batch_size = count
+            return [self._queue.popleft() for _ in range(count)]
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            started = time.perf_counter()
+            futures = [future for _, future, _ in batch]
+            try:
+                results = self.batch_fn([item for item, _, _ in batch])
+                if len(results) != len(batch):
+                    raise ValueError(f"{self.name}: batch function returned {len(results)} results for {len(batch)} items")
+            except Exception as e:
+                for future in futures:
+                    future.set_exception(e)
+            else:
+                for future, result in zip(futures, results):
+                    future.set_result(result)
+            with self._condition:
+                self.batches += 1
+                self.batched_items += len(batch)
+                self.total_wait_seconds += sum(started - submitted_at for _, _, submitted_at in batch)
+                self.batch_sizes[len(batch)] = self.batch_sizes.get(len(batch), 0) + 1
+
+    def stats(self):
+        with self._condition:
+            return {
+                'queue_depth': len(self._queue),
+                'max_queue_depth': self.max_queue_depth,
+                'submitted': self.submitted,
+                'batches': self.batches,
+                'mean_batch_size': self.batched_items / self.batches if self.batches else 0.0,
+                'mean_queue_wait_ms': 1000 * self.total_wait_seconds / self.batched_items if self.batched_items else 0.0,
+                'batch_sizes': dict(sorted(self.batch_sizes.items()))
+            }
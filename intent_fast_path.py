@@ -0,0 +1,166 @@
+# Tiered language detection and transactional-intent classification for bot turns.
+#   Tier 1: compiled keyword regexes and script / character trigram checks (microseconds)
+#   Tier 2: the transformer models (detect_language, is_transactional), only used when the
+#           fast path's confidence is below the threshold
+# Replies to the bot's own prompts (customer ID, transaction month) are mostly digits and
+# reuse the language already memoized for the session instead of being detected again.
+import re
+import threading
+
+# Unicode script ranges of the Indian languages the assistant serves
+SCRIPT_LANGUAGES = [
+    # Scripts shared by several languages stay below the default threshold, so the model decides
+    ('\u0900', '\u097f', 'hi', 0.6), # Devanagari (also Marathi / Nepali)
+    ('\u0980', '\u09ff', 'bn', 0.6), # Bengali (also Assamese)
+    ('\u0a00', '\u0a7f', 'pa', 0.95), # Gurmukhi
+    ('\u0a80', '\u0aff', 'gu', 0.95), # Gujarati
+    ('\u0b00', '\u0b7f', 'or', 0.95), # Odia
+    ('\u0b80', '\u0bff', 'ta', 0.95), # Tamil
+    ('\u0c00', '\u0c7f', 'te', 0.95), # Telugu
+    ('\u0c80', '\u0cff', 'kn', 0.95), # Kannada
+    ('\u0d00', '\u0d7f', 'ml', 0.95), # Malayalam
+]
+_SCRIPT_CONFIDENCE = {lang: confidence for _, _, lang, confidence in SCRIPT_LANGUAGES}
+
+# Common English and banking words; their character trigrams make up the English profile
+ENGLISH_WORDS = """
+a about account accounts after all am an and any are as at atm balance bank banking be been before block
+branch but by can card cards cash change charge charges cheque close credit credited customer day debit
+debited deposit details do does done for from get give had has have help hello hi how i if in interest
+is it last loan me minimum money month my need new no not number of on online open or password payment
+pin please rate receive reset said savings send show spent statement status tell than thank thanks that
+the there this to today transaction transactions transfer transferred upi want was what when where which
+who why will with withdraw withdrawal would year yes you your
+""".split()
+
+TRANSACTIONAL_PATTERNS = [
+    # Only nouns that are about the account's activity: "my debit card" or "my credit limit" are not
+    r"\b(my|mine)\b.*\b(balance|transactions?|statements?|spending|spent)\b",
+    r"\b(account|current|available|remaining)\s+balance\b",
+    r"\b(how much|total)\b.*\b(spent|spend|paid|withdrawn|deposited|debited|credited|balance)\b",
+    r"\b(last|previous|this)\s+(month|week)('s)?\b.*\b(transactions?|spending|statement|payments?|debits|credits|withdrawals?|deposits?)\b",
+    r"\b(transactions?|spending|statement|payments?|debits|credits|withdrawals?|deposits?)\b.*\b(last|previous|this)\s+(month|week)\b",
+    r"\bmini\s+statement\b",
+    r"(बैलेंस|शेष राशि|लेनदेन|लेन-देन|खाते में कितना|कितना खर्च)",
+]
+
+NON_TRANSACTIONAL_PATTERNS = [
+    r"\b(how (do|can|to)|steps to|process (for|to)|procedure)\b",
+    r"\b(reset|change|forgot|forgotten)\b.*\b(pin|password)\b",
+    r"\b(open|close)\b.*\baccount\b",
+    r"\b(interest rates?|minimum balance|branch|timings?|working hours|ifsc|kyc|documents?|eligib\w*)\b",
+    r"\b(block|lost|stolen)\b.*\bcard\b",
+    r"\b(credit|card|withdrawal|transfer|transaction|upi|spending)\s+limits?\b",
+    r"\b(charges?|fees?)\b.*\b(on|for|of)\b.*\bcards?\b",
+    r"\b(apply|activate|upgrade|new|replace(ment)?)\b.*\b(credit|debit|atm)\s+cards?\b",
+    r"^\s*(hi|hello|hey|thanks|thank you|good (morning|afternoon|evening))\b",
+    r"(पिन|पासवर्ड|शाखा|ब्याज दर|खाता खोल)",
+]
+
+_TRANSACTIONAL = [re.compile(pattern, re.IGNORECASE) for pattern in TRANSACTIONAL_PATTERNS]
+_NON_TRANSACTIONAL = [re.compile(pattern, re.IGNORECASE) for pattern in NON_TRANSACTIONAL_PATTERNS]
+_LATIN_WORD = re.compile(r"[a-z]+")
+_HAS_LETTER = re.compile(r"[^\W\d_]")
+
+
+def _trigrams(word):
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+_ENGLISH_TRIGRAMS = set().union(*(_trigrams(word) for word in ENGLISH_WORDS))
+_ENGLISH_WORDS = set(ENGLISH_WORDS)
+
+
+def fast_detect_language(text):
+    # (language, confidence) from the script of the text, or English trigram overlap for Latin text.
+    # Returns (None, 0.0) for text without letters (IDs, dates, amounts).
+    counts = {}
+    latin_letters = 0
+    for char in text:
+        if 'a' <= char.lower() <= 'z':
+            latin_letters += 1
+            continue
+        for start, end, lang, confidence in SCRIPT_LANGUAGES:
+            if start <= char <= end:
+                counts[lang] = counts.get(lang, 0) + 1
+                break
+    if counts:
+        lang = max(counts, key=counts.get)
+        script_share = counts[lang] / (sum(counts.values()) + latin_letters)
+        return lang, _SCRIPT_CONFIDENCE[lang] * script_share
+    words = _LATIN_WORD.findall(text.lower())
+    if not words:
+        return None, 0.0
+    # Share of known words, topped up by trigram overlap for words not in the list
+    known = sum(1 for word in words if word in _ENGLISH_WORDS)
+    trigram_scores = [
+        len(_trigrams(word) & _ENGLISH_TRIGRAMS) / len(_trigrams(word))
+        for word in words if word not in _ENGLISH_WORDS
+    ]
+    score = (known + sum(trigram_scores) * 0.8) / len(words)
+    # Very short Latin text ("ok", "abc") is weak evidence either way
+    if len(words) < 3:
+        score *= 0.85
+    return 'en', score
+
+
+def fast_is_transactional(text, lang):
+    # (is_transactional, confidence) from keyword patterns; confidence 0.0 means "ask the model"
+    if lang not in ('en', 'hi'):
+        return False, 0.0
+    transactional = any(pattern.search(text) for pattern in _TRANSACTIONAL)
+    non_transactional = any(pattern.search(text) for pattern in _NON_TRANSACTIONAL)
+    if transactional and not non_transactional:
+        return True, 0.9
+    if non_transactional and not transactional:
+        return False, 0.85
+    return False, 0.0
+
+
+class TieredClassifier:
+    def __init__(self, detect_language_fn, is_transactional_fn, threshold=0.8):
+        # Tier 2 functions: detect_language_fn(text), is_transactional_fn(text, lang)
+        self.detect_language_fn = detect_language_fn
+        self.is_transactional_fn = is_transactional_fn
+        self.threshold = threshold
+        self._lock = threading.Lock()
+        self.counts = {
+            'language_memoized': 0,
+            'language_fast': 0,
+            'language_model': 0,
+            'intent_fast': 0,
+            'intent_model': 0
+        }
+
+    def _count(self, tier):
+        with self._lock:
+            self.counts[tier] += 1
+
+    def detect_language(self, text, session_lang=None, reuse_session_lang=False):
+        # reuse_session_lang: the message answers a bot prompt (customer ID / month) so the
+        # session's memoized language is used as is
+        if reuse_session_lang and session_lang:
+            self._count('language_memoized')
+            return session_lang
+        lang, confidence = fast_detect_language(text)
+        if lang is None and session_lang and not _HAS_LETTER.search(text):
+            self._count('language_memoized')
+            return session_lang
+        if lang is not None and confidence >= self.threshold:
+            self._count('language_fast')
+            return lang
+        self._count('language_model')
+        return self.detect_language_fn(text)
+
+    def is_transactional(self, text, lang):
+        result, confidence = fast_is_transactional(text, lang)
+        if confidence >= self.threshold:
+            self._count('intent_fast')
+            return result
+        self._count('intent_model')
+        return self.is_transactional_fn(text, lang)
+
+    def stats(self):
+        with self._lock:
+            return dict(self.counts)
@@ -0,0 +1,50 @@
+# Batched language detection and translation, used when a whole bot conversation is
+# handed over to an agent (/initiate_agent_chat). Messages are de-duplicated and grouped
+# by source language so the model runs once per group instead of once per message.
+# If backend.language provides detect_language_batch / translate_batch they are used,
+# otherwise each unique text falls back to the single-message functions.
+from model_registry import models
+
+
+def detect_language_batch(texts):
+    language = models.get('language')
+    unique_texts = list(dict.fromkeys(texts))
+    batch_fn = getattr(language, 'detect_language_batch', None)
+    if batch_fn is not None:
+        detected = batch_fn(unique_texts)
+    else:
+        detected = [language.detect_language(text) for text in unique_texts]
+    lookup = dict(zip(unique_texts, detected))
+    return [lookup[text] for text in texts]
+
+
+def translate_batch(texts, sources, target='en', cache=None):
+    # Translate texts[i] from sources[i] into target, returns the translations in input order.
+    # When a TranslationCache is given, cached translations are reused and new ones stored.
+    groups = {} # Key: source language, Value: unique texts still to translate
+    translations = {} # Key: (text, source), Value: translated text
+    for text, source in zip(texts, sources):
+        if (text, source) in translations or text in groups.get(source, ()):
+            continue
+        cached = cache.get((text, source, target)) if cache is not None else None
+        if cached is not None:
+            translations[(text, source)] = cached
+        else:
+            groups.setdefault(source, {})[text] = None
+
+    if not groups:
+        return [translations[(text, source)] for text, source in zip(texts, sources)]
+    language = models.get('language')
+    batch_fn = getattr(language, 'translate_batch', None)
+    for source, group in groups.items():
+        group_texts = list(group)
+        if batch_fn is not None:
+            translated = batch_fn(group_texts, source=source, target=target)
+        else:
+            translated = [language.translate_text(text, source=source, target=target) for text in group_texts]
+        for text, translated_text in zip(group_texts, translated):
+            translations[(text, source)] = translated_text
+            if cache is not None:
+                cache.put((text, source, target), translated_text)
+
+    return [translations[(text, source)] for text, source in zip(texts, sources)]
@@ -0,0 +1,79 @@
+# In-process publish/subscribe broker used to push chat messages to connected
+# agents and customers (see the /stream endpoints in app.py) instead of having
+# their UIs poll the fetch endpoints on a timer.
+import queue
+import threading
+
+# Per-subscriber buffer. A subscriber that falls this far behind is disconnected;
+# its client reconnects and catches up with the after_seq cursor / Last-Event-ID.
+DEFAULT_QUEUE_SIZE = 256
+
+
+class Subscription:
+    def __init__(self, broker, topic, maxsize):
+        self.broker = broker
+        self.topic = topic
+        self.closed = False
+        self._queue = queue.Queue(maxsize=maxsize)
+
+    def put(self, event):
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(event)
+            return True
+        except queue.Full:
+            self.close()
+            return False
+
+    def get(self, timeout=None):
+        # Next event, or None on timeout / after the subscription was closed
+        if self.closed and self._queue.empty():
+            return None
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.broker.unsubscribe(self)
+
+
+class MessageBroker:
+    def __init__(self, queue_size=DEFAULT_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self._lock = threading.Lock()
+        self._topics = {} # Key: topic, Value: set of Subscriptions
+
+    def subscribe(self, topic):
+        subscription = Subscription(self, topic, self.queue_size)
+        with self._lock:
+            self._topics.setdefault(topic, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._topics.get(subscription.topic)
+            if subscribers is None:
+                return
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._topics[subscription.topic]
+
+    def publish(self, topic, event):
+        # Fan the event out to every subscriber of the topic; returns how many got it
+        with self._lock:
+            subscribers = list(self._topics.get(topic, ()))
+        delivered = 0
+        for subscription in subscribers:
+            if subscription.put(event):
+                delivered += 1
+        return delivered
+
+    def subscriber_count(self, topic=None):
+        with self._lock:
+            if topic is not None:
+                return len(self._topics.get(topic, ()))
+            return sum(len(subscribers) for subscribers in self._topics.values())
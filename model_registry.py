@@ -0,0 +1,116 @@
+# Lazy loading of the backend models.
+# Importing backend.language / backend.semantic_search / backend.orchestrator loads torch,
+# transformers and sentence-transformers models, which used to happen when app.py was
+# imported, before Flask could serve anything. The registry defers each load until the
+# model is first used, or runs them in a background warm-up thread, and records the load
+# state of every model for the /ready endpoint.
+import importlib
+import threading
+import time
+
+NOT_LOADED = 'not_loaded'
+LOADING = 'loading'
+READY = 'ready'
+FAILED = 'failed'
+
+
+class ModelEntry:
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.state = NOT_LOADED
+        self.value = None
+        self.error = None
+        self.load_seconds = None
+        self.lock = threading.Lock()
+
+
+class LazyObject:
+    # Stands in for an attribute of a registered model (a function or an object such as
+    # orchestrator_agent) and loads the model the first time it is called or accessed
+    def __init__(self, registry, model_name, attribute=None):
+        self._registry = registry
+        self._model_name = model_name
+        self._attribute = attribute
+
+    def _resolve(self):
+        value = self._registry.get(self._model_name)
+        return getattr(value, self._attribute) if self._attribute else value
+
+    def __call__(self, *args, **kwargs):
+        return self._resolve()(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._resolve(), name)
+
+
+class ModelRegistry:
+    def __init__(self):
+        self._models = {}
+
+    def register(self, name, loader):
+        self._models[name] = ModelEntry(name, loader)
+
+    def register_module(self, name, module_name):
+        self.register(name, lambda: importlib.import_module(module_name))
+
+    def lazy(self, name, attribute=None):
+        return LazyObject(self, name, attribute)
+
+    def get(self, name):
+        entry = self._models[name]
+        if entry.state == READY:
+            return entry.value
+        with entry.lock: # Concurrent first requests wait for a single load
+            if entry.state != READY:
+                entry.state = LOADING
+                start = time.perf_counter()
+                try:
+                    entry.value = entry.loader()
+                except Exception as e:
+                    entry.state = FAILED
+                    entry.error = str(e)
+                    raise
+                entry.load_seconds = time.perf_counter() - start
+                entry.error = None
+                entry.state = READY
+                print(f"Loaded model '{name}' in {entry.load_seconds:.2f}s")
+        return entry.value
+
+    def warm_up(self, names=None, background=True):
+        # Load the given (default: all) models now, optionally in a daemon thread
+        names = list(names or self._models)
+
+        def load_all():
+            for name in names:
+                try:
+                    self.get(name)
+                except Exception as e:
+                    print(f"Warm-up of model '{name}' failed: {e}")
+
+        if not background:
+            load_all()
+            return None
+        thread = threading.Thread(target=load_all, name='model-warm-up', daemon=True)
+        thread.start()
+        return thread
+
+    def is_ready(self):
+        return all(entry.state == READY for entry in self._models.values())
+
+    def status(self):
+        return {
+            name: {
+                'state': entry.state,
+                'load_seconds': round(entry.load_seconds, 3) if entry.load_seconds is not None else None,
+                'error': entry.error
+            }
+            for name, entry in self._models.items()
+        }
+
+
+# Registry of the backend models used by app.py
+models = ModelRegistry()
+models.register_module('language', 'backend.language')
+models.register_module('semantic_search', 'backend.semantic_search')
+models.register_module('orchestrator', 'backend.orchestrator')
@@ -0,0 +1,224 @@
+# Lightweight per-request tracing for the Flask endpoints.
+# Each request records how long it spent in the named stages of the /chat pipeline
+# (detect_language, is_transactional, get_best_answer, translate_text, orchestrate_transaction)
+# into cumulative histograms, rendered in the Prometheus text format for /metrics.
+# Nested stages are recorded separately, so a stage's time can include a nested one's
+# (get_best_answer includes the translate_text calls it makes).
+#
+# Optionally a sample of requests runs under cProfile (one at a time, cProfile can't
+# nest); the profiles of those that turn out slower than slow_request_seconds are kept.
+import cProfile
+import io
+import os
+import pstats
+import random
+import threading
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+# Upper bounds in seconds, Prometheus client defaults plus finer steps below 5 ms
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class Histogram:
+    def __init__(self, buckets=DEFAULT_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1) # Last slot: above the largest bucket (+Inf)
+        self.count = 0
+        self.sum = 0.0
+        self._lock = threading.Lock()
+
+    def observe(self, seconds):
+        index = len(self.buckets)
+        for i, bound in enumerate(self.buckets):
+            if seconds <= bound:
+                index = i
+                break
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.sum += seconds
+
+    def snapshot(self):
+        # (cumulative bucket counts including +Inf, count, sum)
+        with self._lock:
+            counts, count, total = list(self.counts), self.count, self.sum
+        cumulative = []
+        running = 0
+        for value in counts:
+            running += value
+            cumulative.append(running)
+        return cumulative, count, total
+
+    def quantile(self, q):
+        # Upper bound of the bucket holding the q-th observation (a coarse estimate)
+        cumulative, count, _ = self.snapshot()
+        if not count:
+            return 0.0
+        for bound, running in zip(self.buckets, cumulative):
+            if running >= q * count:
+                return bound
+        return float('inf')
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    escaped = (str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n') for value in labels.values())
+    return '{' + ','.join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + '}'
+
+
+def _value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Trace:
+    def __init__(self, endpoint):
+        self.endpoint = endpoint
+        self.started = time.perf_counter()
+        self.stages = [] # (stage, seconds), in completion order
+        self.profiler = None
+
+
+class Tracer:
+    def __init__(self, buckets=DEFAULT_BUCKETS, slow_request_seconds=None, profile_sample_rate=0.0,
+                 profile_dir=None, keep_profiles=20):
+        self.buckets = buckets
+        self.slow_request_seconds = slow_request_seconds
+        self.profile_sample_rate = profile_sample_rate
+        self.profile_dir = profile_dir
+        self.keep_profiles = keep_profiles
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._profiler_lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        # Drops everything recorded so far (requests in flight are still recorded when they finish)
+        self.request_seconds = {} # Key: endpoint, Value: Histogram
+        self.stage_seconds = {} # Key: stage, Value: Histogram
+        self.requests = {} # Key: (endpoint, status), Value: count
+        self.slow_requests = 0
+        self.profiled_requests = 0
+        self.slow_profiles = [] # Most recent (endpoint, seconds, top functions text)
+
+    def _histogram(self, histograms, name):
+        histogram = histograms.get(name)
+        if histogram is None:
+            with self._lock:
+                histogram = histograms.setdefault(name, Histogram(self.buckets))
+        return histogram
+
+    def start_request(self, endpoint):
+        trace = self._local.trace = Trace(endpoint)
+        if self.profile_sample_rate and random.random() < self.profile_sample_rate:
+            if self._profiler_lock.acquire(blocking=False):
+                profiler = cProfile.Profile()
+                try:
+                    profiler.enable()
+                except ValueError: # Another profiler is active in this process
+                    self._profiler_lock.release()
+                else:
+                    trace.profiler = profiler
+        return trace
+
+    def current(self):
+        return getattr(self._local, 'trace', None)
+
+    def finish_request(self, status=None):
+        # Records the request's total and stage timings; returns the finished trace
+        trace = self.current()
+        if trace is None:
+            return None
+        self._local.trace = None
+        seconds = time.perf_counter() - trace.started
+        if trace.profiler is not None:
+            trace.profiler.disable()
+            self._profiler_lock.release()
+        self._histogram(self.request_seconds, trace.endpoint).observe(seconds)
+        for stage, stage_seconds in trace.stages:
+            self._histogram(self.stage_seconds, stage).observe(stage_seconds)
+        with self._lock:
+            key = (trace.endpoint, status)
+            self.requests[key] = self.requests.get(key, 0) + 1
+            if trace.profiler is not None:
+                self.profiled_requests += 1
+        if self.slow_request_seconds is not None and seconds >= self.slow_request_seconds:
+            with self._lock:
+                self.slow_requests += 1
+            stages = ', '.join(f"{stage} {1000 * stage_seconds:.1f} ms" for stage, stage_seconds in trace.stages)
+            print(f"[Slow request] {trace.endpoint} took {1000 * seconds:.1f} ms ({stages or 'no traced stages'})")
+            if trace.profiler is not None:
+                self._keep_profile(trace, seconds)
+        return trace
+
+    def _keep_profile(self, trace, seconds):
+        output = io.StringIO()
+        stats = pstats.Stats(trace.profiler, stream=output)
+        stats.sort_stats('cumulative').print_stats(15)
+        if self.profile_dir:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            endpoint = trace.endpoint.strip('/').replace('/', '_') or 'root'
+            stats.dump_stats(os.path.join(self.profile_dir, f"{time.strftime('%Y%m%d-%H%M%S')}-{endpoint}-{int(1000 * seconds)}ms.prof"))
+        with self._lock:
+            self.slow_profiles.append((trace.endpoint, seconds, output.getvalue()))
+            del self.slow_profiles[:-self.keep_profiles]
+
+    @contextmanager
+    def stage(self, name):
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - started
+            trace = self.current()
+            if trace is not None:
+                trace.stages.append((name, seconds))
+            else:
+                self._histogram(self.stage_seconds, name).observe(seconds)
+
+    def traced(self, name):
+        # Decorator form of stage()
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                with self.stage(name):
+                    return fn(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def render(self, extra_metrics=()):
+        # Prometheus text exposition format. extra_metrics: [(name, type, help, [(labels, value)])]
+        lines = []
+
+        def histograms(name, help_text, label, by_name):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} histogram")
+            for key, histogram in sorted(by_name.items()):
+                cumulative, count, total = histogram.snapshot()
+                for bound, running in zip(list(self.buckets) + [float('inf')], cumulative):
+                    lines.append(f"{name}_bucket{_labels({label: key, 'le': _value(bound)})} {running}")
+                lines.append(f"{name}_sum{_labels({label: key})} {_value(total)}")
+                lines.append(f"{name}_count{_labels({label: key})} {count}")
+
+        histograms('vista_request_duration_seconds', "Request latency by endpoint.", 'endpoint', dict(self.request_seconds))
+        histograms('vista_stage_duration_seconds', "Time spent in each /chat pipeline stage.", 'stage', dict(self.stage_seconds))
+        with self._lock:
+            requests = dict(self.requests)
+            counters = [
+                ('vista_requests_total', 'counter', "Requests by endpoint and status code.",
+                 [({'endpoint': endpoint, 'status': status}, count) for (endpoint, status), count in sorted(requests.items(), key=str)]),
+                ('vista_slow_requests_total', 'counter', "Requests slower than the slow request threshold.",
+                 [({}, self.slow_requests)]),
+                ('vista_profiled_requests_total', 'counter', "Requests run under cProfile.",
+                 [({}, self.profiled_requests)]),
+            ]
+        for name, metric_type, help_text, samples in counters + list(extra_metrics):
+            lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {metric_type}")
+            for labels, value in samples:
+                lines.append(f"{name}{_labels(labels)} {_value(value)}")
+        return "\n".join(lines) + "\n"
@@ -0,0 +1,329 @@
+# Pluggable nearest-neighbour search engines for the FAQ / knowledge-base index.
+#
+#   exact  brute-force cosine similarity over every row (default, recall 1.0)
+#   ivf    inverted file: k-means clusters, only the n_probe closest clusters are scanned.
+#          With pq_subvectors > 0 the candidates are scored with product-quantized codes and
+#          the best `rerank` of them are re-scored exactly.
+#   hnsw   graph index from the optional hnswlib package (pip install hnswlib)
+#
+# All engines take normalized embeddings (float32, or int8 with per-row scales as stored by
+# faq_index.py) and return (row, score) pairs, best first. Trained ivf / hnsw structures can
+# be saved next to the index so workers don't retrain them on every start.
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+SCORE_CHUNK_ROWS = 8192 # Rows converted to float32 at a time when training / assigning clusters
+INT8_SCORE_CHUNK_ROWS = 1024 # Rows converted at a time when scoring int8 rows, so the copy stays in cache
+
+
+def as_float32_rows(embeddings, scales, rows):
+    vectors = np.asarray(embeddings[rows], dtype=np.float32)
+    if scales is not None:
+        vectors = vectors * scales[rows][:, None]
+    return vectors
+
+
+@contextmanager
+def replacing(path):
+    # Yields a unique temporary path next to `path`, moved over it once the block succeeds,
+    # so workers saving the same structure concurrently never write into each other's file
+    directory, name = os.path.split(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(prefix=f'.{name}.', suffix='.tmp', dir=directory)
+    os.close(fd)
+    try:
+        yield tmp_path
+        os.replace(tmp_path, path)
+    except BaseException:
+        try:
+            os.remove(tmp_path)
+        except OSError:
+            pass
+        raise
+
+
+def score_rows(embeddings, scales, rows, query):
+    # Dot products of the given rows with a float32 query. For int8 rows the per-row scale is
+    # applied to the scores, not to every element of the rows.
+    scores = np.asarray(embeddings[rows], dtype=np.float32) @ query
+    if scales is not None:
+        scores *= scales[rows]
+    return scores
+
+
+def iter_float32_chunks(embeddings, scales, chunk_rows=SCORE_CHUNK_ROWS):
+    for start in range(0, len(embeddings), chunk_rows):
+        stop = min(start + chunk_rows, len(embeddings))
+        chunk = np.asarray(embeddings[start:stop], dtype=np.float32)
+        if scales is not None:
+            chunk = chunk * scales[start:stop, None]
+        yield start, chunk
+
+
+def top_k(scores, k, rows=None):
+    # Best k (row, score) pairs from a score vector, optionally mapped through candidate rows
+    k = min(k, len(scores))
+    if k <= 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top])]
+    if rows is None:
+        return [(int(i), float(scores[i])) for i in top]
+    return [(int(rows[i]), float(scores[i])) for i in top]
+
+
+def assign_clusters(vectors, centroids, spherical=True, chunk_rows=8192):
+    # Closest centroid per vector, by dot product (spherical) or squared L2 distance
+    assignments = np.empty(len(vectors), dtype=np.int64)
+    centroid_norms = (centroids ** 2).sum(axis=1)
+    for start in range(0, len(vectors), chunk_rows):
+        products = vectors[start:start + chunk_rows] @ centroids.T
+        if spherical:
+            assignments[start:start + chunk_rows] = np.argmax(products, axis=1)
+        else:
+            # ||v||^2 is the same for every centroid, so it doesn't change the argmin
+            assignments[start:start + chunk_rows] = np.argmin(centroid_norms[None, :] - 2 * products, axis=1)
+    return assignments
+
+
+def kmeans(vectors, clusters, iterations=10, seed=0, spherical=True):
+    # Plain Lloyd's k-means; spherical keeps centroids normalized so assignment is by dot product
+    rng = np.random.default_rng(seed)
+    clusters = min(clusters, len(vectors))
+    centroids = vectors[rng.choice(len(vectors), clusters, replace=False)].copy()
+    for _ in range(iterations):
+        assignments = assign_clusters(vectors, centroids, spherical)
+        # Per-cluster sums via a sort + reduceat (much faster than np.add.at)
+        order = np.argsort(assignments, kind='stable')
+        counts = np.bincount(assignments, minlength=clusters)
+        sums = np.zeros_like(centroids)
+        present = np.flatnonzero(counts)
+        starts = np.concatenate(([0], np.cumsum(counts[present])[:-1]))
+        sums[present] = np.add.reduceat(vectors[order], starts, axis=0)
+        empty = counts == 0
+        counts[empty] = 1
+        centroids = np.where(empty[:, None], centroids, sums / counts[:, None])
+        if spherical:
+            norms = np.linalg.norm(centroids, axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            centroids = centroids / norms
+    return centroids.astype(np.float32)
+
+
+class ExactSearch:
+    name = 'exact'
+
+    def __init__(self, embeddings, scales=None):
+        self.embeddings = embeddings
+        self.scales = scales
+
+    def scores(self, query):
+        query = np.asarray(query, dtype=np.float32)
+        if self.scales is None:
+            return self.embeddings @ query
+        # int8 rows are converted chunk by chunk into the same cache-sized float32 buffer, and
+        # the per-row scales are applied to the scores instead of to every element
+        count = len(self.embeddings)
+        scores = np.empty(count, dtype=np.float32)
+        buffer = np.empty((min(INT8_SCORE_CHUNK_ROWS, count), self.embeddings.shape[1]), dtype=np.float32)
+        for start in range(0, count, INT8_SCORE_CHUNK_ROWS):
+            stop = min(start + INT8_SCORE_CHUNK_ROWS, count)
+            chunk = buffer[:stop - start]
+            np.copyto(chunk, self.embeddings[start:stop], casting='unsafe')
+            np.matmul(chunk, query, out=scores[start:stop])
+        return scores * self.scales
+
+    def search(self, query, k=1):
+        return top_k(self.scores(query), k)
+
+
+class IVFSearch:
+    name = 'ivf'
+
+    def __init__(self, embeddings, scales=None, n_lists=None, n_probe=8, pq_subvectors=0, rerank=64,
+                 train_size=50000, iterations=10, seed=0):
+        self.embeddings = embeddings
+        self.scales = scales
+        self.n_lists = n_lists or max(1, int(4 * np.sqrt(len(embeddings))))
+        self.n_probe = n_probe
+        self.pq_subvectors = pq_subvectors
+        self.rerank = rerank
+        self.train_size = train_size
+        self.iterations = iterations
+        self.seed = seed
+        self.centroids = None
+        self.list_rows = None # Row ids grouped by cluster
+        self.list_offsets = None # list_rows[list_offsets[c]:list_offsets[c + 1]] are cluster c's rows
+        self.pq_codebooks = None # (pq_subvectors, 256, sub_dim)
+        self.pq_codes = None # (rows, pq_subvectors) uint8
+
+    def params(self):
+        # Everything the trained structure depends on, so a cached one is only reused for the same values
+        return {'n_lists': self.n_lists, 'pq_subvectors': self.pq_subvectors, 'train_size': self.train_size,
+                'iterations': self.iterations, 'seed': self.seed}
+
+    def train(self):
+        rng = np.random.default_rng(self.seed)
+        count = len(self.embeddings)
+        sample_rows = np.sort(rng.choice(count, min(self.train_size, count), replace=False))
+        sample = as_float32_rows(self.embeddings, self.scales, sample_rows)
+        self.centroids = kmeans(sample, self.n_lists, self.iterations, self.seed)
+        self.n_lists = len(self.centroids)
+
+        assignments = np.empty(count, dtype=np.int32)
+        for start, chunk in iter_float32_chunks(self.embeddings, self.scales):
+            assignments[start:start + len(chunk)] = assign_clusters(chunk, self.centroids)
+        self.list_rows = np.argsort(assignments, kind='stable').astype(np.int32)
+        self.list_offsets = np.searchsorted(assignments[self.list_rows], np.arange(self.n_lists + 1)).astype(np.int64)
+
+        if self.pq_subvectors:
+            self._train_pq(sample)
+        return self
+
+    def _train_pq(self, sample):
+        dim = sample.shape[1]
+        if dim % self.pq_subvectors:
+            raise ValueError(f"pq_subvectors ({self.pq_subvectors}) must divide the embedding size ({dim})")
+        sub_dim = dim // self.pq_subvectors
+        codebooks = []
+        for m in range(self.pq_subvectors):
+            sub_sample = sample[:, m * sub_dim:(m + 1) * sub_dim]
+            codebook = kmeans(sub_sample, 256, self.iterations, self.seed + m, spherical=False)
+            if len(codebook) < 256:
+                codebook = np.vstack([codebook, np.zeros((256 - len(codebook), sub_dim), dtype=np.float32)])
+            codebooks.append(codebook)
+        self.pq_codebooks = np.stack(codebooks)
+        self.pq_codes = np.empty((len(self.embeddings), self.pq_subvectors), dtype=np.uint8)
+        for start, chunk in iter_float32_chunks(self.embeddings, self.scales):
+            for m in range(self.pq_subvectors):
+                sub_chunk = chunk[:, m * sub_dim:(m + 1) * sub_dim]
+                self.pq_codes[start:start + len(chunk), m] = assign_clusters(sub_chunk, self.pq_codebooks[m], spherical=False)
+
+    def state(self):
+        state = {'centroids': self.centroids, 'list_rows': self.list_rows, 'list_offsets': self.list_offsets}
+        if self.pq_subvectors:
+            state['pq_codebooks'] = self.pq_codebooks
+            state['pq_codes'] = self.pq_codes
+        return state
+
+    def load_state(self, state):
+        self.centroids = state['centroids']
+        self.n_lists = len(self.centroids)
+        self.list_rows = state['list_rows']
+        self.list_offsets = state['list_offsets']
+        if self.pq_subvectors:
+            self.pq_codebooks = state['pq_codebooks']
+            self.pq_codes = state['pq_codes']
+        return self
+
+    def save(self, path):
+        with replacing(path) as tmp_path, open(tmp_path, 'wb') as f:
+            np.savez(f, **self.state()) # A file object, so numpy doesn't append .npz
+
+    def load(self, path):
+        with np.load(path) as state:
+            return self.load_state({name: state[name] for name in state.files})
+
+    def candidates(self, query):
+        probe = min(self.n_probe, self.n_lists)
+        closest = np.argpartition(-(self.centroids @ query), probe - 1)[:probe]
+        return np.concatenate([self.list_rows[self.list_offsets[c]:self.list_offsets[c + 1]] for c in closest])
+
+    def search(self, query, k=1):
+        query = np.asarray(query, dtype=np.float32)
+        rows = np.sort(self.candidates(query)) # Sorted rows read the mmap sequentially
+        if len(rows) == 0:
+            return []
+        if not self.pq_subvectors:
+            return top_k(score_rows(self.embeddings, self.scales, rows, query), k, rows)
+
+        # Asymmetric distance: per-subspace lookup tables of query . codeword
+        sub_dim = self.pq_codebooks.shape[2]
+        tables = np.einsum('mcd,md->mc', self.pq_codebooks, query.reshape(self.pq_subvectors, sub_dim))
+        codes = self.pq_codes[rows]
+        approx = tables[np.arange(self.pq_subvectors), codes].sum(axis=1)
+        if not self.rerank:
+            return top_k(approx, k, rows)
+        shortlist = [row for row, _ in top_k(approx, max(self.rerank, k), rows)]
+        shortlist = np.sort(np.array(shortlist))
+        return top_k(score_rows(self.embeddings, self.scales, shortlist, query), k, shortlist)
+
+
+class HNSWSearch:
+    name = 'hnsw'
+
+    def __init__(self, embeddings, scales=None, m=16, ef_construction=200, ef_search=64, threads=-1):
+        try:
+            import hnswlib
+        except ImportError:
+            raise ImportError("The 'hnsw' search engine needs the optional hnswlib package (pip install hnswlib)") from None
+        self._hnswlib = hnswlib
+        self.embeddings = embeddings
+        self.scales = scales
+        self.m = m
+        self.ef_construction = ef_construction
+        self.ef_search = ef_search
+        self.threads = threads
+        self.index = None
+
+    def params(self):
+        return {'m': self.m, 'ef_construction': self.ef_construction}
+
+    def _new_index(self):
+        return self._hnswlib.Index(space='ip', dim=self.embeddings.shape[1])
+
+    def train(self):
+        self.index = self._new_index()
+        self.index.init_index(max_elements=len(self.embeddings), M=self.m, ef_construction=self.ef_construction)
+        for start, chunk in iter_float32_chunks(self.embeddings, self.scales):
+            self.index.add_items(chunk, np.arange(start, start + len(chunk)), num_threads=self.threads)
+        self.index.set_ef(self.ef_search)
+        return self
+
+    def save(self, path):
+        with replacing(path) as tmp_path:
+            self.index.save_index(tmp_path)
+
+    def load(self, path):
+        self.index = self._new_index()
+        self.index.load_index(path, max_elements=len(self.embeddings))
+        self.index.set_ef(self.ef_search)
+        return self
+
+    def search(self, query, k=1):
+        k = min(k, len(self.embeddings))
+        if k <= 0:
+            return []
+        # ef is set once on train / load: set_ef isn't safe while other threads query the shared
+        # index, and hnswlib already searches with max(ef, k)
+        labels, distances = self.index.knn_query(np.asarray(query, dtype=np.float32), k=k)
+        # hnswlib's 'ip' distance is 1 - dot product
+        return [(int(row), float(1.0 - distance)) for row, distance in zip(labels[0], distances[0])]
+
+
+ENGINES = {
+    'exact': ExactSearch,
+    'ivf': IVFSearch,
+    'hnsw': HNSWSearch
+}
+
+
+def build_engine(name, embeddings, scales=None, cache_path=None, **params):
+    # Create a search engine by name. For trained engines, cache_path (without extension) is
+    # where the trained structure is saved and, if it already exists, loaded from.
+    if name not in ENGINES:
+        raise ValueError(f"Unknown search engine '{name}', expected one of: {', '.join(ENGINES)}")
+    engine = ENGINES[name](embeddings, scales, **params)
+    if name == 'exact':
+        return engine
+    if cache_path is None:
+        return engine.train()
+    param_tag = '-'.join(f"{key}{value}" for key, value in sorted(engine.params().items()))
+    path = f"{cache_path}-{param_tag}.{'npz' if name == 'ivf' else 'bin'}"
+    if os.path.exists(path):
+        return engine.load(path)
+    engine.train()
+    engine.save(path)
+    return engine
@@ -0,0 +1,163 @@
+# In-memory storage for session contexts with a customer_id -> session_id index.
+# The endpoints in app.py need to go from a customer_id to that customer's session
+# (to read their language and display name) on every agent message and for every
+# row of the agent dashboard. Keeping the index next to the contexts turns those
+# lookups into dict hits instead of scans over every live session.
+# With idle_ttl_seconds, sessions that haven't been used for that long are evicted, so a
+# long-running worker doesn't keep every session it has ever seen.
+import threading
+import time
+from collections import OrderedDict
+
+
+def new_context(**overrides):
+    # Default context for a fresh (or reset) session
+    context = {
+        'awaiting_customer_id': False,
+        'awaiting_transaction_month': False,
+        'user_query_for_orchestration': None,
+        'customer_id': None, # This will store the actual customer_id once known
+        'transaction_month': None,
+        'is_connected_to_agent': False, # Flag to indicate agent connection
+        'customer_original_lang': 'en', # Default, will be detected and updated
+        'customer_name': 'Customer' # Default name
+    }
+    context.update(overrides)
+    return context
+
+
+class SessionStore:
+    def __init__(self, idle_ttl_seconds=None, clock=time.monotonic):
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self.evicted = 0
+        self._clock = clock
+        self._last_used = OrderedDict() # Key: session_id, least recently used first
+        self._lock = threading.RLock() # Guards the contexts, the index and the LRU order
+        self._contexts = {}
+        # session_id -> creation sequence, so lookups return the oldest session for a
+        # customer (the same one a scan over the contexts in insertion order would find)
+        self._order = {}
+        self._next_order = 0
+        # customer_id -> {session_id: None}
+        self._by_customer = {}
+
+    def __contains__(self, session_id):
+        return session_id in self._contexts
+
+    def __getitem__(self, session_id):
+        context = self._contexts[session_id]
+        self._touch(session_id)
+        return context
+
+    def __setitem__(self, session_id, context):
+        self.set(session_id, context)
+
+    def __len__(self):
+        return len(self._contexts)
+
+    def get(self, session_id, default=None):
+        context = self._contexts.get(session_id)
+        if context is None:
+            return default
+        self._touch(session_id)
+        return context
+
+    def items(self):
+        return self._contexts.items()
+
+    def set(self, session_id, context):
+        # Replace the whole context for a session (used when a session is created or reset)
+        with self._lock:
+            old_context = self._contexts.get(session_id)
+            if old_context is None:
+                self._order[session_id] = self._next_order
+                self._next_order += 1
+            else:
+                self._unindex(session_id, old_context.get('customer_id'))
+            self._contexts[session_id] = context
+            self._index(session_id, context.get('customer_id'))
+            self._touch(session_id)
+        return context
+
+    def update(self, session_id, **fields):
+        # Update individual fields of a session context and return it. Changes must go
+        # through here (not through the context dict directly) to keep the index in sync
+        # and to be saved by the shared state backends (state_backend.py).
+        with self._lock:
+            context = self._contexts[session_id]
+            if 'customer_id' in fields and fields['customer_id'] != context.get('customer_id'):
+                self._unindex(session_id, context.get('customer_id'))
+                self._index(session_id, fields['customer_id'])
+            context.update(fields)
+            self._touch(session_id)
+        return context
+
+    def find_session(self, customer_id):
+        # Oldest session currently bound to this customer_id, or None
+        sessions = self._by_customer.get(customer_id)
+        if not sessions:
+            return None
+        if len(sessions) == 1:
+            return next(iter(sessions))
+        return min(sessions, key=self._order.__getitem__)
+
+    def find_context(self, customer_id):
+        session_id = self.find_session(customer_id)
+        if session_id is None:
+            return None
+        return self._contexts[session_id]
+
+    def customer_lang(self, customer_id, default='en'):
+        context = self.find_context(customer_id)
+        if context is None:
+            return default
+        return context.get('customer_original_lang', default)
+
+    def customer_name(self, customer_id, default=None):
+        context = self.find_context(customer_id)
+        if context is None:
+            return default
+        return context.get('customer_name', default)
+
+    def evict_idle(self, now=None):
+        # Drops sessions unused for idle_ttl_seconds; returns how many were evicted.
+        # Lookups by customer_id (find_session, customer_lang, ...) don't count as use.
+        if self.idle_ttl_seconds is None:
+            return 0
+        now = self._clock() if now is None else now
+        count = 0
+        with self._lock:
+            while self._last_used:
+                session_id, last_used = next(iter(self._last_used.items()))
+                if now - last_used < self.idle_ttl_seconds:
+                    break
+                del self._last_used[session_id]
+                context = self._contexts.pop(session_id, None)
+                if context is not None:
+                    self._unindex(session_id, context.get('customer_id'))
+                    del self._order[session_id]
+                    count += 1
+            self.evicted += count
+        return count
+
+    def _touch(self, session_id):
+        if self.idle_ttl_seconds is None:
+            return
+        now = self._clock()
+        with self._lock:
+            self._last_used[session_id] = now
+            self._last_used.move_to_end(session_id)
+        self.evict_idle(now)
+
+    def _index(self, session_id, customer_id):
+        if customer_id is None:
+            return
+        self._by_customer.setdefault(customer_id, {})[session_id] = None
+
+    def _unindex(self, session_id, customer_id):
+        sessions = self._by_customer.get(customer_id)
+        if sessions is None:
+            return
+        sessions.pop(session_id, None)
+        if not sessions:
+            del self._by_customer[customer_id]
@@ -0,0 +1,369 @@
+# Pluggable storage for the state app.py keeps between requests: session contexts, agent
+# chats and the agents' unread counters.
+#   'memory'  SessionStore / ChatStore (session_store.py, chat_store.py) in this process,
+#             each chat guarded by its own lock. Single worker process only.
+#   'sqlite'  SharedSessionStore / SharedChatStore below, in one SQLite file in WAL mode, so
+#             several Gunicorn workers on the host serve the same sessions and chats.
+#             Sequence numbers and unread counters are updated inside write transactions,
+#             so concurrent appends and read marks from any worker stay consistent.
+#
+# Every backend provides the same interface, which is all app.py relies on:
+#   sessions:  `in`, [], []=, len(), get, set, update, find_session, find_context,
+#              customer_lang, customer_name, evict_idle
+#   chats:     `in`, [], len(), get, get_or_create, items
+#   chat logs: append, messages_after, messages_before, mark_read_by_agent, last_message,
+#              last_seq, unread_by_agent
+import json
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+
+from chat_store import ChatArchive, ChatMessage, ChatStore
+from session_store import SessionStore
+
+TOUCH_INTERVAL_SECONDS = 60 # last_used is only rewritten when older than this
+EVICT_INTERVAL_SECONDS = 60 # How often each process deletes idle sessions
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS sessions ("
+    "session_id TEXT PRIMARY KEY, customer_id TEXT, context TEXT NOT NULL, "
+    "created INTEGER NOT NULL, last_used REAL NOT NULL)",
+    "CREATE INDEX IF NOT EXISTS idx_sessions_customer ON sessions (customer_id, created)",
+    # New sessions take MAX(created) + 1 inside the write lock: an index lookup, not a scan
+    "CREATE INDEX IF NOT EXISTS idx_sessions_created ON sessions (created)",
+    "CREATE INDEX IF NOT EXISTS idx_sessions_last_used ON sessions (last_used)",
+    "CREATE TABLE IF NOT EXISTS chats ("
+    "customer_id TEXT PRIMARY KEY, last_seq INTEGER NOT NULL, unread_by_agent INTEGER NOT NULL, "
+    "last_used REAL NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS chat_messages ("
+    "customer_id TEXT NOT NULL, seq INTEGER NOT NULL, sender TEXT NOT NULL, "
+    "original_text TEXT NOT NULL, translated_text TEXT, lang TEXT, timestamp TEXT, "
+    "read_by_agent INTEGER NOT NULL, PRIMARY KEY (customer_id, seq)) WITHOUT ROWID",
+]
+
+_MESSAGE_COLUMNS = (
+    "sender, original_text, COALESCE(translated_text, original_text), lang, timestamp, read_by_agent, seq"
+)
+
+
+def _message(row):
+    return ChatMessage(*row[:5], read_by_agent=bool(row[5]), seq=row[6])
+
+
+class SharedDatabase:
+    # One connection per thread (sqlite3 connections must not be used concurrently).
+    # Write transactions use BEGIN IMMEDIATE, so they queue on SQLite's write lock
+    # instead of failing when two workers upgrade a read lock at the same time.
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        with self.write() as conn:
+            for statement in SCHEMA:
+                conn.execute(statement)
+
+    def connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def write(self):
+        conn = self.connection()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+
+class SharedSessionStore:
+    def __init__(self, db, idle_ttl_seconds=None, clock=time.time):
+        self.db = db
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._clock = clock
+        self._evicted_at = 0.0
+
+    def __contains__(self, session_id):
+        return self._load(session_id) is not None
+
+    def __getitem__(self, session_id):
+        context = self._load(session_id)
+        if context is None:
+            raise KeyError(session_id)
+        return context
+
+    def __setitem__(self, session_id, context):
+        self.set(session_id, context)
+
+    def __len__(self):
+        return self.db.connection().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def get(self, session_id, default=None):
+        context = self._load(session_id)
+        return default if context is None else context
+
+    def set(self, session_id, context):
+        now = self._clock()
+        with self.db.write() as conn:
+            conn.execute(
+                "INSERT INTO sessions (session_id, customer_id, context, created, last_used) "
+                "VALUES (?, ?, ?, (SELECT COALESCE(MAX(created), 0) + 1 FROM sessions), ?) "
+                "ON CONFLICT (session_id) DO UPDATE SET "
+                "customer_id = excluded.customer_id, context = excluded.context, last_used = excluded.last_used",
+                (session_id, context.get('customer_id'), json.dumps(context), now)
+            )
+        self._maybe_evict(now)
+        return context
+
+    def update(self, session_id, **fields):
+        # Atomic read-modify-write of the stored context; returns the updated context
+        now = self._clock()
+        with self.db.write() as conn:
+            row = conn.execute("SELECT context FROM sessions WHERE session_id = ?", (session_id,)).fetchone()
+            if row is None:
+                raise KeyError(session_id)
+            context = json.loads(row[0])
+            context.update(fields)
+            conn.execute(
+                "UPDATE sessions SET customer_id = ?, context = ?, last_used = ? WHERE session_id = ?",
+                (context.get('customer_id'), json.dumps(context), now, session_id)
+            )
+        return context
+
+    def find_session(self, customer_id):
+        # Oldest session currently bound to this customer_id, or None
+        row = self.db.connection().execute(
+            "SELECT session_id FROM sessions WHERE customer_id = ? ORDER BY created LIMIT 1", (customer_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def find_context(self, customer_id):
+        row = self.db.connection().execute(
+            "SELECT context FROM sessions WHERE customer_id = ? ORDER BY created LIMIT 1", (customer_id,)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def customer_lang(self, customer_id, default='en'):
+        context = self.find_context(customer_id)
+        if context is None:
+            return default
+        return context.get('customer_original_lang', default)
+
+    def customer_name(self, customer_id, default=None):
+        context = self.find_context(customer_id)
+        if context is None:
+            return default
+        return context.get('customer_name', default)
+
+    def evict_idle(self, now=None):
+        if self.idle_ttl_seconds is None:
+            return 0
+        now = self._clock() if now is None else now
+        with self.db.write() as conn:
+            return conn.execute("DELETE FROM sessions WHERE last_used < ?", (now - self.idle_ttl_seconds,)).rowcount
+
+    def _load(self, session_id):
+        # The context as a new dict: changes must be saved with set() / update()
+        row = self.db.connection().execute(
+            "SELECT context, last_used FROM sessions WHERE session_id = ?", (session_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = self._clock()
+        if now - row[1] >= TOUCH_INTERVAL_SECONDS:
+            with self.db.write() as conn:
+                conn.execute("UPDATE sessions SET last_used = ? WHERE session_id = ?", (now, session_id))
+            self._maybe_evict(now)
+        return json.loads(row[0])
+
+    def _maybe_evict(self, now):
+        if self.idle_ttl_seconds is not None and now - self._evicted_at >= EVICT_INTERVAL_SECONDS:
+            self._evicted_at = now
+            self.evict_idle(now)
+
+
+class SharedChatLog:
+    def __init__(self, db, customer_id, clock=time.time):
+        self.db = db
+        self.customer_id = customer_id
+        self._clock = clock
+
+    def __len__(self):
+        return self.last_seq
+
+    def __iter__(self):
+        return iter(self.messages_after(0))
+
+    @property
+    def last_seq(self):
+        row = self.db.connection().execute(
+            "SELECT last_seq FROM chats WHERE customer_id = ?", (self.customer_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    @property
+    def unread_by_agent(self):
+        row = self.db.connection().execute(
+            "SELECT unread_by_agent FROM chats WHERE customer_id = ?", (self.customer_id,)
+        ).fetchone()
+        return row[0] if row else 0
+
+    def append(self, message):
+        # Stores the message (a dict or ChatMessage), assigns its sequence number and
+        # returns the stored record
+        if not isinstance(message, ChatMessage):
+            message = ChatMessage.from_dict(message)
+        unread = int(message.sender == 'user' and not message.read_by_agent)
+        with self.db.write() as conn:
+            message.seq = conn.execute(
+                "INSERT INTO chats (customer_id, last_seq, unread_by_agent, last_used) VALUES (?, 1, ?, ?) "
+                "ON CONFLICT (customer_id) DO UPDATE SET last_seq = last_seq + 1, "
+                "unread_by_agent = unread_by_agent + excluded.unread_by_agent, last_used = excluded.last_used "
+                "RETURNING last_seq",
+                (self.customer_id, unread, self._clock())
+            ).fetchall()[0][0]
+            conn.execute(
+                "INSERT INTO chat_messages VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (self.customer_id, message.seq, message.sender, message.original_text,
+                 None if message.translated_text is message.original_text else message.translated_text,
+                 message.lang, message.timestamp, int(message.read_by_agent))
+            )
+        return message
+
+    def last_message(self):
+        row = self.db.connection().execute(
+            f"SELECT {_MESSAGE_COLUMNS} FROM chat_messages WHERE customer_id = ? ORDER BY seq DESC LIMIT 1",
+            (self.customer_id,)
+        ).fetchone()
+        return _message(row) if row else None
+
+    def messages_after(self, after_seq=0):
+        rows = self.db.connection().execute(
+            f"SELECT {_MESSAGE_COLUMNS} FROM chat_messages WHERE customer_id = ? AND seq > ? ORDER BY seq",
+            (self.customer_id, after_seq)
+        ).fetchall()
+        return [_message(row) for row in rows]
+
+    def messages_before(self, before_seq, limit=50):
+        rows = self.db.connection().execute(
+            f"SELECT {_MESSAGE_COLUMNS} FROM chat_messages WHERE customer_id = ? AND seq < ? "
+            "ORDER BY seq DESC LIMIT ?",
+            (self.customer_id, before_seq, limit)
+        ).fetchall()
+        return [_message(row) for row in reversed(rows)]
+
+    def mark_read_by_agent(self, messages):
+        # Only rows still unread are updated, so two workers marking the same message
+        # decrement the counter once
+        seqs = [msg['seq'] for msg in messages if msg['sender'] == 'user' and not msg.get('read_by_agent', False)]
+        if not seqs:
+            return
+        with self.db.write() as conn:
+            marked = conn.executemany(
+                "UPDATE chat_messages SET read_by_agent = 1 "
+                "WHERE customer_id = ? AND seq = ? AND sender = 'user' AND read_by_agent = 0",
+                [(self.customer_id, seq) for seq in seqs]
+            ).rowcount
+            if marked:
+                conn.execute(
+                    "UPDATE chats SET unread_by_agent = unread_by_agent - ? WHERE customer_id = ?",
+                    (marked, self.customer_id)
+                )
+        for msg in messages:
+            if msg['sender'] == 'user':
+                msg['read_by_agent'] = True
+
+
+class SharedChatStore:
+    # Chats stay on disk; idle_ttl_seconds only hides chats without recent activity from
+    # items() (the agent dashboard), like the in-memory store evicting them
+    def __init__(self, db, idle_ttl_seconds=None, clock=time.time):
+        self.db = db
+        self.idle_ttl_seconds = idle_ttl_seconds
+        self._clock = clock
+
+    def __contains__(self, customer_id):
+        return self._last_used(customer_id) is not None
+
+    def __getitem__(self, customer_id):
+        chat = self.get(customer_id)
+        if chat is None:
+            raise KeyError(customer_id)
+        return chat
+
+    def __len__(self):
+        return len(self._active_ids())
+
+    def get(self, customer_id, default=None):
+        last_used = self._last_used(customer_id)
+        if last_used is None:
+            return default
+        self._touch(customer_id, last_used)
+        return SharedChatLog(self.db, customer_id, self._clock)
+
+    def get_or_create(self, customer_id):
+        last_used = self._last_used(customer_id)
+        if last_used is None:
+            with self.db.write() as conn:
+                conn.execute(
+                    "INSERT OR IGNORE INTO chats (customer_id, last_seq, unread_by_agent, last_used) VALUES (?, 0, 0, ?)",
+                    (customer_id, self._clock())
+                )
+        else:
+            self._touch(customer_id, last_used)
+        return SharedChatLog(self.db, customer_id, self._clock)
+
+    def items(self):
+        return [(customer_id, SharedChatLog(self.db, customer_id, self._clock)) for customer_id in self._active_ids()]
+
+    def _active_ids(self):
+        since = self._clock() - self.idle_ttl_seconds if self.idle_ttl_seconds is not None else float('-inf')
+        rows = self.db.connection().execute(
+            "SELECT customer_id FROM chats WHERE last_used >= ? ORDER BY rowid", (since,)
+        ).fetchall()
+        return [row[0] for row in rows]
+
+    def _last_used(self, customer_id):
+        row = self.db.connection().execute(
+            "SELECT last_used FROM chats WHERE customer_id = ?", (customer_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def _touch(self, customer_id, last_used):
+        now = self._clock()
+        if now - last_used >= TOUCH_INTERVAL_SECONDS:
+            with self.db.write() as conn:
+                conn.execute("UPDATE chats SET last_used = ? WHERE customer_id = ?", (now, customer_id))
+
+
+def create_memory_backend(idle_ttl_seconds=None, archive_path=None, max_in_memory=200, **unused):
+    sessions = SessionStore(idle_ttl_seconds=idle_ttl_seconds)
+    chats = ChatStore(ChatArchive(archive_path), max_in_memory=max_in_memory, idle_ttl_seconds=idle_ttl_seconds)
+    return sessions, chats
+
+
+def create_sqlite_backend(idle_ttl_seconds=None, db_path=None, **unused):
+    if not db_path:
+        raise ValueError("The 'sqlite' state backend needs a database path (VISTA_STATE_DB)")
+    db = SharedDatabase(db_path)
+    return SharedSessionStore(db, idle_ttl_seconds), SharedChatStore(db, idle_ttl_seconds)
+
+
+BACKENDS = {
+    'memory': create_memory_backend,
+    'sqlite': create_sqlite_backend,
+}
+
+
+def create_backend(name, **params):
+    # Returns (session store, chat store)
+    if name not in BACKENDS:
+        raise ValueError(f"Unknown state backend '{name}', expected one of {sorted(BACKENDS)}")
+    return BACKENDS[name](**params)
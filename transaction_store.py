@@ -0,0 +1,298 @@
+# SQLite store for customer transactions, for the orchestrator's per-month data access.
+# Lookups are always by (customer_id, month), so the table has a composite index on those
+# columns, extended with the columns the aggregates read so summaries never touch the table.
+# Connections are pooled and reused across requests instead of opened per query.
+# Aggregated results are cached per (customer_id, month) and tagged with that key's write
+# version; triggers bump the version on every insert / update / delete, including writes
+# from other processes, so a cached result is recomputed as soon as new data is written.
+# Only results computed from this store (summary()) are cached here: app.py doesn't cache the
+# orchestrator's answers, which come from its own data source and can't be invalidated this way.
+#
+# The app's store is configured from the environment and shared through get_transaction_store(),
+# which the orchestrator imports for its per-month reads: VISTA_TRANSACTION_DB is the database
+# file (unset: no store, get_transaction_store() returns None), VISTA_TRANSACTION_DB_POOL_SIZE
+# the connection pool size and VISTA_TRANSACTION_CACHE_SIZE the number of cached results.
+#
+# Seed a local dataset for benchmarking:
+#   python transaction_store.py seed --db transactions.db --customers 20000 --months 12 --per-month 10
+import argparse
+import os
+import queue
+import random
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from lru_cache import LRUCache
+
+SCHEMA = [
+    "CREATE TABLE IF NOT EXISTS transactions ("
+    "id INTEGER PRIMARY KEY, customer_id TEXT NOT NULL, month TEXT NOT NULL, "
+    "posted_on TEXT NOT NULL, amount REAL NOT NULL, "
+    "direction TEXT NOT NULL CHECK (direction IN ('debit', 'credit')), "
+    "category TEXT NOT NULL, description TEXT NOT NULL)",
+    "CREATE TABLE IF NOT EXISTS transaction_versions ("
+    "customer_id TEXT NOT NULL, month TEXT NOT NULL, version INTEGER NOT NULL, "
+    "PRIMARY KEY (customer_id, month)) WITHOUT ROWID",
+]
+
+INDEXES = [
+    "CREATE INDEX IF NOT EXISTS idx_transactions_customer_month "
+    "ON transactions (customer_id, month, direction, category, amount)",
+]
+
+_BUMP_VERSION = (
+    "INSERT INTO transaction_versions (customer_id, month, version) VALUES ({row}.customer_id, {row}.month, 1) "
+    "ON CONFLICT (customer_id, month) DO UPDATE SET version = version + 1;"
+)
+TRIGGERS = [
+    "CREATE TRIGGER IF NOT EXISTS transactions_insert AFTER INSERT ON transactions BEGIN "
+    + _BUMP_VERSION.format(row='NEW') + " END",
+    "CREATE TRIGGER IF NOT EXISTS transactions_update AFTER UPDATE ON transactions BEGIN "
+    + _BUMP_VERSION.format(row='OLD') + " " + _BUMP_VERSION.format(row='NEW') + " END",
+    "CREATE TRIGGER IF NOT EXISTS transactions_delete AFTER DELETE ON transactions BEGIN "
+    + _BUMP_VERSION.format(row='OLD') + " END",
+]
+
+CATEGORIES = {
+    'debit': ['groceries', 'utilities', 'dining', 'fuel', 'shopping', 'rent', 'atm withdrawal', 'emi'],
+    'credit': ['salary', 'refund', 'interest', 'transfer in'],
+}
+
+
+def connect(db_path):
+    conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA cache_size=-65536") # 64 MB page cache per connection
+    conn.execute("PRAGMA mmap_size=268435456")
+    return conn
+
+
+class ConnectionPool:
+    def __init__(self, db_path, size=4):
+        self.db_path = db_path
+        self.size = size
+        self.created = 0
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self):
+        # Reuses an idle connection, opens a new one while below size, otherwise waits
+        conn = self._acquire()
+        try:
+            yield conn
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            self._idle.put(conn)
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self.created < self.size:
+                self.created += 1
+                return connect(self.db_path)
+        return self._idle.get()
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class TransactionStore:
+    def __init__(self, db_path, pool_size=4, cache_size=10000):
+        self.pool = ConnectionPool(db_path, pool_size)
+        self.results = LRUCache(cache_size) # Key: (customer_id, month, result key), Value: (version, result)
+        self.stale = 0 # Cached results dropped because the (customer_id, month) was written to
+        with self.pool.connection() as conn:
+            for statement in SCHEMA + INDEXES + TRIGGERS:
+                conn.execute(statement)
+            conn.commit()
+
+    def add_transactions(self, rows):
+        # rows: [(customer_id, posted_on 'YYYY-MM-DD', amount, direction, category, description)]
+        rows = [(row[0], row[1][:7]) + tuple(row[1:]) for row in rows]
+        with self.pool.connection() as conn:
+            conn.executemany(
+                "INSERT INTO transactions (customer_id, month, posted_on, amount, direction, category, description) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                rows
+            )
+            conn.commit()
+        return len(rows)
+
+    def version(self, customer_id, month):
+        with self.pool.connection() as conn:
+            row = conn.execute(
+                "SELECT version FROM transaction_versions WHERE customer_id = ? AND month = ?",
+                (customer_id, month)
+            ).fetchone()
+        return row[0] if row else 0
+
+    def cached(self, customer_id, month, key, compute):
+        # Result of compute() for (customer_id, month), reused until that key is written to
+        version = self.version(customer_id, month)
+        cache_key = (customer_id, month, key)
+        entry = self.results.get(cache_key)
+        if entry is not None:
+            if entry[0] == version:
+                return entry[1]
+            self.stale += 1
+        result = compute()
+        self.results.put(cache_key, (version, result))
+        return result
+
+    def transactions(self, customer_id, month, limit=None):
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT posted_on, amount, direction, category, description FROM transactions "
+                "WHERE customer_id = ? AND month = ? ORDER BY posted_on, id LIMIT ?",
+                (customer_id, month, -1 if limit is None else limit)
+            ).fetchall()
+        return [
+            {'posted_on': posted_on, 'amount': amount, 'direction': direction, 'category': category, 'description': description}
+            for posted_on, amount, direction, category, description in rows
+        ]
+
+    def summary(self, customer_id, month):
+        return self.cached(customer_id, month, 'summary', lambda: self._compute_summary(customer_id, month))
+
+    def _compute_summary(self, customer_id, month):
+        # Served from idx_transactions_customer_month alone (covering index)
+        with self.pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT direction, category, COUNT(*), SUM(amount), MAX(amount) FROM transactions "
+                "WHERE customer_id = ? AND month = ? GROUP BY direction, category",
+                (customer_id, month)
+            ).fetchall()
+        summary = {
+            'customer_id': customer_id,
+            'month': month,
+            'count': 0,
+            'total_debit': 0.0,
+            'total_credit': 0.0,
+            'largest_debit': 0.0,
+            'debit_by_category': {},
+            'credit_by_category': {}
+        }
+        for direction, category, count, total, largest in rows:
+            summary['count'] += count
+            summary[f'total_{direction}'] += total
+            summary[f'{direction}_by_category'][category] = round(total, 2)
+            if direction == 'debit':
+                summary['largest_debit'] = max(summary['largest_debit'], largest)
+        summary['total_debit'] = round(summary['total_debit'], 2)
+        summary['total_credit'] = round(summary['total_credit'], 2)
+        summary['net'] = round(summary['total_credit'] - summary['total_debit'], 2)
+        return summary
+
+    def stats(self):
+        return {
+            'cached_results': len(self.results),
+            'hits': self.results.hits,
+            'misses': self.results.misses,
+            'stale': self.stale,
+            'pool_size': self.pool.size,
+            'pool_connections': self.pool.created
+        }
+
+    def close(self):
+        self.pool.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_transaction_store():
+    # Opened on first use, then shared by every caller in the process
+    global _store
+    if _store is None and os.environ.get('VISTA_TRANSACTION_DB'):
+        with _store_lock:
+            if _store is None:
+                _store = TransactionStore(
+                    os.environ['VISTA_TRANSACTION_DB'],
+                    pool_size=int(os.environ.get('VISTA_TRANSACTION_DB_POOL_SIZE', 4)),
+                    cache_size=int(os.environ.get('VISTA_TRANSACTION_CACHE_SIZE', 10000))
+                )
+    return _store
+
+
+def customer_ids(customers):
+    return [f"CUST{i:06d}" for i in range(1, customers + 1)]
+
+
+def months_back(count, last_month='2024-12'):
+    year, month = map(int, last_month.split('-'))
+    months = []
+    for _ in range(count):
+        months.append(f"{year:04d}-{month:02d}")
+        year, month = (year, month - 1) if month > 1 else (year - 1, 12)
+    return months[::-1]
+
+
+def seed(db_path, customers=20000, months=12, per_month=10, seed_value=0):
+    # Bulk-loads a synthetic dataset: rows are inserted before the index and triggers exist
+    # (much faster), then TransactionStore creates them. Returns the number of rows.
+    rng = random.Random(seed_value)
+    conn = connect(db_path)
+    for statement in SCHEMA:
+        conn.execute(statement)
+    month_list = months_back(months)
+
+    def rows():
+        for customer_id in customer_ids(customers):
+            for month in month_list:
+                for _ in range(rng.randint(max(per_month // 2, 1), per_month * 3 // 2)):
+                    direction = 'credit' if rng.random() < 0.2 else 'debit'
+                    category = rng.choice(CATEGORIES[direction])
+                    posted_on = f"{month}-{rng.randint(1, 28):02d}"
+                    amount = round(rng.lognormvariate(7, 1), 2)
+                    yield customer_id, month, posted_on, amount, direction, category, f"{category} {posted_on}"
+
+    conn.executemany(
+        "INSERT INTO transactions (customer_id, month, posted_on, amount, direction, category, description) "
+        "VALUES (?, ?, ?, ?, ?, ?, ?)",
+        rows()
+    )
+    conn.commit()
+    count = conn.execute("SELECT COUNT(*) FROM transactions").fetchone()[0]
+    conn.close()
+    TransactionStore(db_path, pool_size=1).close()
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Transaction store utilities")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    seed_parser = subparsers.add_parser('seed', help="Generate a synthetic transaction dataset")
+    seed_parser.add_argument('--db', required=True)
+    seed_parser.add_argument('--customers', type=int, default=20000)
+    seed_parser.add_argument('--months', type=int, default=12)
+    seed_parser.add_argument('--per-month', type=int, default=10)
+    summary_parser = subparsers.add_parser('summary', help="Print the summary of one customer and month")
+    summary_parser.add_argument('--db', required=True)
+    summary_parser.add_argument('customer_id')
+    summary_parser.add_argument('month')
+    args = parser.parse_args()
+
+    if args.command == 'seed':
+        count = seed(args.db, args.customers, args.months, args.per_month)
+        print(f"Seeded {count} transactions into {args.db}")
+    else:
+        store = TransactionStore(args.db)
+        print(store.summary(args.customer_id, args.month))
+        store.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,125 @@
+# Process-wide cache for machine translation results.
+# Every customer <-> agent message goes through translate_text, and agents keep sending
+# the same canned phrases in the same handful of languages. Translations are cached by
+# (text, source, target) with LRU eviction and an optional TTL. An optional SQLite file
+# keeps the cache warm across restarts.
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+
+class TranslationCache:
+    def __init__(self, translate_fn, max_entries=10000, ttl_seconds=None, db_path=None):
+        self.translate_fn = translate_fn
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict() # Key: (text, source, target), Value: (translated_text, created_at)
+        self._lock = threading.Lock()
+        self._db = None
+        if db_path:
+            self._open_db(db_path)
+
+    def translate(self, text, source='en', target='en'):
+        # Drop-in replacement for translate_text(text, source=..., target=...)
+        key = (text, source, target)
+        translated = self.get(key)
+        if translated is not None:
+            return translated
+        translated = self.translate_fn(text, source=source, target=target)
+        self.put(key, translated)
+        return translated
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and not self._expired(entry[1], now):
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[0]
+            if entry is not None:
+                del self._entries[key]
+            entry = self._load_from_db(key, now)
+            if entry is not None:
+                self._store(key, entry)
+                self.hits += 1
+                return entry[0]
+            self.misses += 1
+            return None
+
+    def put(self, key, translated):
+        if translated is None:
+            return
+        entry = (translated, time.time())
+        with self._lock:
+            self._store(key, entry)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO translations (text, source, target, translated, created_at) VALUES (?, ?, ?, ?, ?)",
+                    (key[0], key[1], key[2], entry[0], entry[1])
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM translations")
+                self._db.commit()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'hit_rate': self.hits / lookups if lookups else 0.0
+            }
+
+    def _store(self, key, entry):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _expired(self, created_at, now):
+        return self.ttl_seconds is not None and now - created_at > self.ttl_seconds
+
+    def _open_db(self, db_path):
+        # One shared connection, only used while holding self._lock
+        self._db = sqlite3.connect(db_path, check_same_thread=False)
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS translations ("
+            "text TEXT NOT NULL, source TEXT NOT NULL, target TEXT NOT NULL, "
+            "translated TEXT NOT NULL, created_at REAL NOT NULL, "
+            "PRIMARY KEY (text, source, target))"
+        )
+        if self.ttl_seconds is not None:
+            self._db.execute("DELETE FROM translations WHERE created_at < ?", (time.time() - self.ttl_seconds,))
+        self._db.commit()
+        # Warm the in-memory LRU with the most recently stored translations
+        rows = self._db.execute(
+            "SELECT text, source, target, translated, created_at FROM translations ORDER BY created_at DESC LIMIT ?",
+            (self.max_entries,)
+        ).fetchall()
+        for text, source, target, translated, created_at in reversed(rows):
+            self._entries[(text, source, target)] = (translated, created_at)
+
+    def _load_from_db(self, key, now):
+        if self._db is None:
+            return None
+        row = self._db.execute(
+            "SELECT translated, created_at FROM translations WHERE text = ? AND source = ? AND target = ?",
+            key
+        ).fetchone()
+        if row is None or self._expired(row[1], now):
+            return None
+        return row